@@ -6,16 +6,32 @@ import multiprocessing
 import shutil
 import signal
 import datetime
-from typing import List
+from typing import List, Tuple
 from cevast.certdb import CertDB, CertNotAvailableError
 from cevast.utils import make_PEM_filename
+from cevast.utils.logging import get_log_queue, setup_worker_logger
 from .cert_analyser import CertAnalyser
 from .methods import get_all, get, show
 
 log = logging.getLogger(__name__)
 
+# Number of scheduled chains dispatched to the pool at once
+SCHEDULE_BATCH_SIZE = 4096
+# Number of chains sent to a worker process in a single task
+SCHEDULE_CHUNK_SIZE = 256
+
+# Worker state, initialized in every worker process by ChainValidator.__init_worker
+WORKER_CERTDB = None
+WORKER_TMP_DIR = None
+VALIDATION_METHODS = []
+REFERENCE_DATE = None
+VALIDATION_METHOD_ARGUMENTS = {}
+LOCK = None
+WORKER_EXPORTED = {}
+WORKER_EXPORTED_FILES = set()
+WORKER_MISSING = set()
+
 
-# TODO fix logging into rotatefilehandler within multiprocessing
 class ChainValidator(CertAnalyser):
     """
     CertAnalyser implementation that validates certificate chains. Validation function
@@ -68,6 +84,7 @@ class ChainValidator(CertAnalyser):
         log.info("Reference date: {0}, ({1})".format(self.__reference_date, int(self.__reference_date.strftime("%s"))))
 
         self.__lock = multiprocessing.Lock()
+        self.__scheduled = []
 
         # Initialize pool and workers
         if not self.__single:
@@ -78,7 +95,9 @@ class ChainValidator(CertAnalyser):
                                                          methods,
                                                          self.__reference_date,
                                                          self.__lock,
-                                                         True))
+                                                         True,
+                                                         get_log_queue(),
+                                                         logging.getLogger('cevast').level))
         else:
             ChainValidator.__init_worker(self.__certdb, self.__export_dir, methods, self.__reference_date, self.__lock)
 
@@ -86,7 +105,7 @@ class ChainValidator(CertAnalyser):
 
     @staticmethod
     def __init_worker(certdb: CertDB, tmp_dir: str, methods: list, reference_date: datetime.date,
-                      lock: multiprocessing.Lock, ignore_sigint: bool = False):
+                      lock: multiprocessing.Lock, ignore_sigint: bool = False, log_queue=None, log_level: int = None):
         """Create and initialize global variables used in validate method. {Not nice, but working well
         with multiprocessing pool -> sharing instance of CertDB - object is not copied because of copy-on-write fork()}
         """
@@ -94,25 +113,57 @@ class ChainValidator(CertAnalyser):
         global WORKER_TMP_DIR
         global VALIDATION_METHODS
         global REFERENCE_DATE
+        global VALIDATION_METHOD_ARGUMENTS
         global LOCK
+        global WORKER_EXPORTED
+        global WORKER_EXPORTED_FILES
+        global WORKER_MISSING
         WORKER_CERTDB = certdb
         WORKER_TMP_DIR = tmp_dir
         VALIDATION_METHODS = methods
         REFERENCE_DATE = reference_date
+        VALIDATION_METHOD_ARGUMENTS = {"reference_time": int(reference_date.strftime("%s"))}
         LOCK = lock
+        # Certificates already exported (ID -> path) and not available in CertDB by this worker
+        WORKER_EXPORTED = {}
+        WORKER_MISSING = set()
+        # Files exported in previous runs are listed at once instead of checking them one by one,
+        # export directory may not exist yet (CertDB export would create it)
+        os.makedirs(tmp_dir, exist_ok=True)
+        with os.scandir(tmp_dir) as entries:
+            WORKER_EXPORTED_FILES = {entry.name for entry in entries}
         if ignore_sigint:
             # let worker processes ignore SIGINT, parent will cleanup pool via teminate()
             signal.signal(signal.SIGINT, signal.SIG_IGN)
+        if log_queue is not None:
+            setup_worker_logger(log_queue, log_level)
 
     def schedule(self, host: str, chain: List[str]) -> None:
         if self.__single:
             self.__out.write(ChainValidator._validate(host, chain))
         else:
-            self.__pool.apply_async(ChainValidator._validate, args=(host, chain), callback=self.__out.write)
+            # Chains are dispatched in batches to save the per-task IPC
+            self.__scheduled.append((host, chain))
+            if len(self.__scheduled) >= SCHEDULE_BATCH_SIZE:
+                self.__dispatch()
+
+    def __dispatch(self) -> None:
+        """Dispatch the scheduled chains to the pool, results are written by a callback."""
+        if self.__scheduled:
+            self.__pool.map_async(ChainValidator._validate_task, self.__scheduled,
+                                  chunksize=SCHEDULE_CHUNK_SIZE, callback=self.__out.writelines,
+                                  error_callback=ChainValidator.__batch_failed)
+            self.__scheduled = []
+
+    @staticmethod
+    def __batch_failed(error: BaseException) -> None:
+        """Log a batch that failed outside of validation tasks, e.g. while passing it to the pool."""
+        log.error("Batch of scheduled chains failed: %r", error)
 
     def done(self) -> None:
         # Wait for workers to finish
         if not self.__single:
+            self.__dispatch()
             self.__pool.close()
             self.__pool.join()
         # Close output file
@@ -122,6 +173,18 @@ class ChainValidator(CertAnalyser):
         if self.__cleanup_export_dir:
             shutil.rmtree(self.__export_dir)
 
+    @staticmethod
+    def _validate_task(task: Tuple[str, List[str]]) -> str:
+        """
+        Validation function of single validation task given as (host, chain) tuple.
+        Failure of a single task is logged and results in an empty result, so the rest of the batch is kept.
+        """
+        try:
+            return ChainValidator._validate(*task)
+        except Exception:  # pylint: disable=W0703
+            log.exception("HOST <%s> validation failed", task[0])
+            return ""
+
     @staticmethod
     def _validate(host: str, chain: List[str]) -> str:
         """
@@ -132,34 +195,56 @@ class ChainValidator(CertAnalyser):
         result = []
         pems = []
 
-        # check if already exported first
-        LOCK.acquire()
-        try:
-            for cert in chain:
-                # TODO make some structure to not overload single directory
-                path = WORKER_TMP_DIR + make_PEM_filename(cert)
-                if not os.path.exists(path):
-                    try:
-                        path = WORKER_CERTDB.export(cert, WORKER_TMP_DIR, False)
-                    except CertNotAvailableError:
-                        log.info("HOST <%s> has broken chain", host)
-                        return ""
-                pems.append(path)
-        finally:
-            LOCK.release()
-
-        validation_method_arguments = {"reference_time": int(REFERENCE_DATE.strftime("%s"))}
+        for cert in chain:
+            path = WORKER_EXPORTED.get(cert)
+            if path is None:
+                try:
+                    path = ChainValidator._export(cert)
+                except CertNotAvailableError:
+                    log.info("HOST <%s> has broken chain", host)
+                    return ""
+            pems.append(path)
 
         # Call validation methods
         for method in VALIDATION_METHODS:
-            result.append("|".join([str(item).replace(",", ";") for item in method(pems, **validation_method_arguments)]))
+            result.append("|".join([str(item).replace(",", ";") for item in method(pems, **VALIDATION_METHOD_ARGUMENTS)]))
 
         return "{},{},{}\n".format(host, ",".join(result), ",".join(chain))
 
+    @staticmethod
+    def _export(cert: str) -> str:
+        """
+        Export certificate to the worker's export directory (if not already there) and return the path.
+        The result is cached by the worker, so the export directory and CertDB are checked once per certificate.
+        """
+        if cert in WORKER_MISSING:
+            raise CertNotAvailableError(cert)
+        # check if already exported first
+        LOCK.acquire()
+        try:
+            # TODO make some structure to not overload single directory
+            filename = make_PEM_filename(cert)
+            path = WORKER_TMP_DIR + filename
+            if filename not in WORKER_EXPORTED_FILES and not os.path.exists(path):
+                try:
+                    path = WORKER_CERTDB.export(cert, WORKER_TMP_DIR, False)
+                except CertNotAvailableError:
+                    WORKER_MISSING.add(cert)
+                    raise
+        finally:
+            LOCK.release()
+        WORKER_EXPORTED[cert] = path
+        return path
+
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
         if not self.__single:
-            self.__pool.terminate()
+            if exc_type is None:
+                # Let the workers finish and exit, terminating them could break the shared log queue
+                self.__pool.close()
+                self.__pool.join()
+            else:
+                self.__pool.terminate()
         self.__out.close()
@@ -75,6 +75,7 @@ try:
     from .modules.validation_clients.openssl import Openssl
 
     if Openssl.is_setup_correctly():
+        Openssl.prepare()
         METHODS["openssl"] = Openssl.verify
     else:
         log.info("The client is not set up correctly")
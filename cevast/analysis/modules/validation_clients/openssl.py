@@ -15,10 +15,25 @@ command-line interface.
 """
 
 import argparse
+import atexit
 import datetime
+import functools
 import os
 import re
+import shutil
 import subprocess
+import tempfile
+
+# Error codes reported by `openssl verify`, matched directly in the raw command output
+_ERROR_RE = re.compile(rb'\nerror (\d+) at')
+# Certificates in the trust store file (including the ones with OpenSSL trust settings)
+_CERTIFICATE_RE = re.compile(rb'-----BEGIN ((?:TRUSTED )?)CERTIFICATE-----.+?-----END \1CERTIFICATE-----', re.DOTALL)
+
+
+def _remove_ca_path(ca_path, pid):
+    """Removes the hashed CA directory at exit of the process `pid` that created it (not of its forked children)."""
+    if os.getpid() == pid:
+        shutil.rmtree(ca_path, ignore_errors=True)
 
 
 # noinspection PyBroadException
@@ -49,7 +64,12 @@ class Openssl:
         chain = list(chain)
 
         try:
-            command = ["openssl", "verify", "-CAfile", Openssl.TRUST_STORE_FILE, "-no-CApath"]
+            ca_path = Openssl._get_ca_path(Openssl.TRUST_STORE_FILE)
+
+            if ca_path:
+                command = ["openssl", "verify", "-CApath", ca_path, "-no-CAfile"]
+            else:
+                command = ["openssl", "verify", "-CAfile", Openssl.TRUST_STORE_FILE, "-no-CApath"]
 
             if reference_time:
                 command += ["-attime", str(reference_time)]
@@ -70,7 +90,7 @@ class Openssl:
             except subprocess.CalledProcessError as error:
                 result = [-1]
 
-                matches = re.findall(r'\nerror (\d+) at', error.output.decode())
+                matches = _ERROR_RE.findall(error.output)
 
                 if len(matches) > 0:
                     result = sorted(set([int(match) for match in matches]))
@@ -79,6 +99,49 @@ class Openssl:
 
         return result
 
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _get_ca_path(trust_store_file):
+        """
+        Returns a hashed CA directory (as created by `openssl rehash`) with the certificates from `trust_store_file`,
+        or None if it cannot be created.
+
+        With the directory, OpenSSL loads only the CA certificates it looks up instead of parsing the whole trust store
+        file on every validation. The directory is private to the process, created once and removed when it exits.
+        Worker processes forked afterwards share it, so it should be created before (see `prepare`).
+        """
+
+        try:
+            ca_path = tempfile.mkdtemp(prefix="cevast_openssl_ca_")
+        except OSError:
+            return None
+        atexit.register(_remove_ca_path, ca_path, os.getpid())
+
+        try:
+            with open(trust_store_file, "rb") as input_file:
+                trust_store = input_file.read()
+
+            for i, match in enumerate(_CERTIFICATE_RE.finditer(trust_store)):
+                with open(os.path.join(ca_path, "{}.pem".format(i)), "wb") as output_file:
+                    output_file.write(match.group(0) + b"\n")
+
+            subprocess.check_output(["openssl", "rehash", ca_path], stderr=subprocess.STDOUT)
+        except (OSError, subprocess.CalledProcessError):
+            shutil.rmtree(ca_path, ignore_errors=True)
+            ca_path = None
+
+        return ca_path
+
+    @staticmethod
+    def prepare():
+        """
+        Prepares the hashed CA directory of `TRUST_STORE_FILE` in the current process.
+
+        Worker processes of multiprocessing pools do not run atexit handlers, so the directory should be
+        created by the main process before the workers are forked.
+        """
+        Openssl._get_ca_path(Openssl.TRUST_STORE_FILE)
+
     @staticmethod
     def is_setup_correctly():
         """
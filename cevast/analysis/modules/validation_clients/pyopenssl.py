@@ -16,6 +16,7 @@ command-line interface.
 
 import argparse
 import datetime
+import functools
 import os
 from OpenSSL import crypto  # pylint: disable=import-error
 
@@ -48,30 +49,14 @@ class Pyopenssl:
         chain = list(chain)
 
         try:
-            for i, certificate_path in enumerate(chain):
-                with open(certificate_path) as input_file:
-                    chain[i] = input_file.read().encode()
-
-            store = crypto.X509Store()
+            store = Pyopenssl._get_store(Pyopenssl.TRUST_STORE_FILE, reference_time, tuple(crls) if crls else None)
             intermediates = []
 
-            store.load_locations(Pyopenssl.TRUST_STORE_FILE)
-
-            endpoint = crypto.load_certificate(crypto.FILETYPE_PEM, chain[0])
+            endpoint = Pyopenssl._load_certificate(chain[0])
 
             if len(chain) > 1:
-                for certificate_content in chain[1:]:
-                    intermediates.append(crypto.load_certificate(crypto.FILETYPE_PEM, certificate_content))
-
-            if reference_time:
-                store.set_time(datetime.datetime.fromtimestamp(reference_time))
-
-            if crls:
-                for crl in crls:
-                    with open(crl) as input_file:
-                        store.add_crl(crypto.load_crl(type=crypto.FILETYPE_PEM, buffer="".join(input_file.readlines())))
-
-                store.set_flags(crypto.X509StoreFlags.CRL_CHECK)
+                for certificate_path in chain[1:]:
+                    intermediates.append(Pyopenssl._load_intermediate(certificate_path))
 
             result = 0
 
@@ -85,6 +70,51 @@ class Pyopenssl:
 
         return [result]
 
+    @staticmethod
+    def _load_certificate(certificate_path):
+        """
+        Loads a PEM certificate from `certificate_path`.
+        """
+
+        with open(certificate_path) as input_file:
+            return crypto.load_certificate(crypto.FILETYPE_PEM, input_file.read().encode())
+
+    @staticmethod
+    @functools.lru_cache(maxsize=2 ** 16)
+    def _load_intermediate(certificate_path):
+        """
+        Loads a PEM certificate from `certificate_path`, intermediate certificates repeat in many chains,
+        so the loaded ones are cached by the path.
+        """
+
+        return Pyopenssl._load_certificate(certificate_path)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=16)
+    def _get_store(trust_store_file, reference_time, crls):
+        """
+        Returns a trust store loaded from `trust_store_file` set up for given `reference_time` and `crls`.
+
+        Loading of the trust store is expensive, so the store is built once and reused by all the validations
+        with the same arguments (`crls` must be hashable, e.g. a tuple).
+        """
+
+        store = crypto.X509Store()
+
+        store.load_locations(trust_store_file)
+
+        if reference_time:
+            store.set_time(datetime.datetime.fromtimestamp(reference_time))
+
+        if crls:
+            for crl in crls:
+                with open(crl) as input_file:
+                    store.add_crl(crypto.load_crl(type=crypto.FILETYPE_PEM, buffer="".join(input_file.readlines())))
+
+            store.set_flags(crypto.X509StoreFlags.CRL_CHECK)
+
+        return store
+
     @staticmethod
     def is_setup_correctly():
         """
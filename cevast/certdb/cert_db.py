@@ -19,7 +19,7 @@ This module provides interface of CertDB class
 """
 
 from abc import ABC, abstractmethod
-from typing import Tuple
+from typing import Iterable, Tuple
 
 __author__ = 'Radim Podola'
 
@@ -68,11 +68,11 @@ class CertDBReadOnly(ABC):
         """
 
     @abstractmethod
-    def exists_all(self, cert_ids: list) -> bool:
+    def exists_all(self, cert_ids: Iterable[str]) -> bool:
         """
         Test that all certificates exist in the database.
 
-        `cert_ids` is a list of certificate identifiers.
+        `cert_ids` is an iterable (list, set, ...) of certificate identifiers, it is iterated only once.
         """
 
 
@@ -90,6 +90,16 @@ class CertDB(CertDBReadOnly):
         A expected format of certificate is PEM.
         """
 
+    def insert_many(self, certs: Iterable[Tuple[str, str]]) -> None:
+        """
+        Insert multiple certificates to the database at once.
+
+        `certs` is an iterable of pairs ('cert_id', 'cert'), each pair is inserted the same way as by `insert`.
+        """
+        insert = self.insert
+        for cert_id, cert in certs:
+            insert(cert_id, cert)
+
     @abstractmethod
     def delete(self, cert_id: str) -> None:
         """
@@ -100,6 +110,16 @@ class CertDB(CertDBReadOnly):
         in the current transaction is deleted immediatelly.
         """
 
+    def delete_many(self, cert_ids: Iterable[str]) -> None:
+        """
+        Delete multiple certificates from the database at once.
+
+        `cert_ids` is an iterable of certificate identifiers, each is deleted the same way as by `delete`.
+        """
+        delete = self.delete
+        for cert_id in cert_ids:
+            delete(cert_id)
+
     @abstractmethod
     def rollback(self) -> None:
         """
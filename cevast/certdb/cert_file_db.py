@@ -38,16 +38,18 @@ b = 2
 "2020-05-30 22:44:48" = "added=5; removed=1;"
 """
 
+import io
 import os
 import shutil
 import logging
 import multiprocessing as mp
-from typing import Tuple
+from typing import Iterable, Tuple
 from datetime import datetime
 from collections import OrderedDict
 from zipfile import ZipFile, ZIP_DEFLATED
 import toml
 from cevast.utils import make_PEM_filename, remove_empty_folders
+from cevast.utils.logging import get_log_queue, setup_worker_logger
 from cevast.certdb.cert_db import (
     CertDB,
     CertDBReadOnly,
@@ -59,6 +61,9 @@ __author__ = 'Radim Podola'
 
 log = logging.getLogger(__name__)
 
+# Size of the buffer used to write DB index
+BUFFER_SIZE = 2 ** 18
+
 # TODO parallel transaction checking - mmap
 # - open transaction Flag - will be set by INSERT/REMOVE/ROLLBACK/COMMIT -> OpenTransaction/CloseTransaction decorator ??
 # - allow_more_transaction Flag that will not raise DBInUse error??
@@ -202,13 +207,31 @@ class CertFileDBReadOnly(CertDBReadOnly):
         log.debug('<%s> does not exist', cert_id)
         return False
 
-    def exists_all(self, cert_ids: list) -> bool:
+    def exists_all(self, cert_ids: Iterable[str]) -> bool:
+        # Consecutive certificates from the same block are looked up in a single listing of its archive
+        block_archive, listing = None, frozenset()
         for cert_id in cert_ids:
-            if not self.exists(cert_id):
+            if cert_id in self._cache:
+                continue
+            zip_file = self._get_block_archive(cert_id)
+            if zip_file != block_archive:
+                block_archive, listing = zip_file, self._list_block_archive(zip_file)
+            if cert_id not in listing:
+                log.debug('<%s> does not exist', cert_id)
                 return False
+            self._cache.add(cert_id)
 
         return True
 
+    @staticmethod
+    def _list_block_archive(block_archive: str) -> frozenset:
+        """Return names of all certificates persisted in block archive"""
+        try:
+            with ZipFile(block_archive, 'r', ZIP_DEFLATED) as z_obj:
+                return frozenset(z_obj.namelist())
+        except FileNotFoundError:
+            return frozenset()
+
     def _get_block_path(self, cert_or_block_id: str) -> str:
         """Return full block path of certificate or block id"""
         paths = [cert_or_block_id[: 2 + i] for i in range(self._params['structure_level'])]
@@ -297,6 +320,19 @@ class CertFileDB(CertDB, CertFileDBReadOnly):
         # Check if certificate exists persisted
         return CertFileDBReadOnly.exists(self, cert_id) if cert_id in self._certs_in_db else False
 
+    def exists_all(self, cert_ids: Iterable[str]) -> bool:
+        # Resolve open transaction first, the rest is looked up in block archives together
+        persisted = []
+        for cert_id in cert_ids:
+            if self._is_in_transaction(cert_id, self._to_insert):
+                continue
+            if self._is_in_transaction(cert_id, self._to_delete) or cert_id not in self._certs_in_db:
+                log.debug('<%s> does not exist', cert_id)
+                return False
+            persisted.append(cert_id)
+
+        return CertFileDBReadOnly.exists_all(self, persisted)
+
     def insert(self, cert_id: str, cert: str) -> None:
         if not cert_id or not cert:
             raise CertInvalidError('cert_id <{}> or cert <{}> invalid'.format(cert_id, cert))
@@ -387,7 +423,12 @@ class CertFileDB(CertDB, CertFileDBReadOnly):
         cnt_inserted = 0
         cpus = self.__cpu_cores if self.__cpu_cores > 0 else None
 
-        pool = mp.Pool(cpus)
+        log_queue = get_log_queue()
+        if log_queue is not None:
+            # Workers log through the queue of the main process
+            pool = mp.Pool(cpus, setup_worker_logger, (log_queue, logging.getLogger('cevast').level))
+        else:
+            pool = mp.Pool(cpus)
         # Handle delete first because sequence matter
         results = []
         for block, certs in self._to_delete.items():
@@ -415,21 +456,24 @@ class CertFileDB(CertDB, CertFileDBReadOnly):
         if certs and os.path.exists(block_archive):
             deleted_all = True
             new_block_archive = block_archive + '_new'
+            # New archive is built in memory and written at once, see persist_certs
+            new_archive = io.BytesIO()
             with ZipFile(block_archive, 'r', ZIP_DEFLATED) as zin,\
-                 ZipFile(new_block_archive, 'w', ZIP_DEFLATED) as zout:
+                 ZipFile(new_archive, 'w', ZIP_DEFLATED) as zout:
                 for name in zin.namelist():
                     if os.path.splitext(name)[0] not in certs:
                         zout.writestr(name, zin.read(name))
                         deleted_all = False
                     else:
                         cnt_deleted += 1
-            # Remove the original zipfile and replace it with new one
-            os.remove(block_archive)
             if deleted_all:
                 # Delete the empty zipfile
-                os.remove(new_block_archive)
+                os.remove(block_archive)
             else:
-                os.rename(new_block_archive, block_archive)
+                # Replace the original zipfile with new one
+                with open(new_block_archive, 'wb') as output_file:
+                    output_file.write(new_archive.getbuffer())
+                os.replace(new_block_archive, block_archive)
 
         log.debug('Deleted %d certificates from block %s', cnt_deleted, block_archive)
         return cnt_deleted
@@ -450,18 +494,26 @@ class CertFileDB(CertDB, CertFileDBReadOnly):
             log.debug('Creating archive: %s', block_archive)
 
         # TODO compare performance for higher compresslevel
-        with ZipFile(block_archive, "a" if append else "w", ZIP_DEFLATED) as zout:
-            if append:
-                persisted_certs = zout.namelist()
+        # Archive is built in memory and written at once, zipfile writes the small members piece by piece
+        # and seeks back to patch their headers, what would flush a file buffer for every member
+        if append:
+            with open(block_archive, 'rb') as input_file:
+                archive = io.BytesIO(input_file.read())
+        else:
+            archive = io.BytesIO()
+        with ZipFile(archive, "a" if append else "w", ZIP_DEFLATED) as zout:
+            persisted_certs = set(zout.namelist())
 
             for cert in certs:
                 cert_file = block_path + cert
-                if append and cert in persisted_certs:
+                if cert in persisted_certs:
                     pass  # do not insert duplicates
                 else:
                     zout.write(cert_file, cert)
                     cnt_inserted += 1
                 os.remove(cert_file)
+        with open(block_archive, 'wb') as output_file:
+            output_file.write(archive.getbuffer())
 
         log.debug('Persisted %d certificates from block %s', cnt_inserted, block_path)
         return cnt_inserted
@@ -527,7 +579,7 @@ class CertFileDB(CertDB, CertFileDBReadOnly):
     def _write_index(self):
         log.info('Writing DB index')
 
-        with open(self._index_path, 'wt') as output_file:
+        with open(self._index_path, 'wt', buffering=BUFFER_SIZE) as output_file:
             for certificate_hash in self._certs_in_db:
                 output_file.write('{0}\n'.format(certificate_hash))
 
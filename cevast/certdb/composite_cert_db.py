@@ -8,7 +8,7 @@ This module contains implementation of CompositeCertDB.
 """
 
 import logging
-from typing import List, Tuple, Union
+from typing import Iterable, List, Tuple, Union
 from cevast.certdb.cert_db import (
     CertDB,
     CertDBReadOnly,
@@ -69,7 +69,7 @@ class CompositeCertDBReadOnly(CertDBReadOnly):
                 return True
         return False
 
-    def exists_all(self, cert_ids: list) -> bool:
+    def exists_all(self, cert_ids: Iterable[str]) -> bool:
         for cert_id in cert_ids:
             for child in self._children:
                 if child.exists(cert_id):
@@ -113,10 +113,22 @@ class CompositeCertDB(CertDB, CompositeCertDBReadOnly):
         for child in self.__io_allowed:
             child.insert(cert_id, cert)
 
+    def insert_many(self, certs: Iterable[Tuple[str, str]]) -> None:
+        # Certificates are passed to every child, so iterate them only once
+        certs = tuple(certs)
+        for child in self.__io_allowed:
+            child.insert_many(certs)
+
     def delete(self, cert_id: str) -> None:
         for child in self.__io_allowed:
             child.delete(cert_id)
 
+    def delete_many(self, cert_ids: Iterable[str]) -> None:
+        # Certificates are passed to every child, so iterate them only once
+        cert_ids = tuple(cert_ids)
+        for child in self.__io_allowed:
+            child.delete_many(cert_ids)
+
     def rollback(self) -> None:
         for child in self.__io_allowed:
             child.rollback()
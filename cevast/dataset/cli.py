@@ -9,7 +9,7 @@ import click
 from click import IntRange
 
 from cevast.certdb import CertFileDB, CertFileDBReadOnly
-from cevast.utils.logging import setup_cevast_logger, setup_cli_logger
+from cevast.utils.logging import setup_cevast_logger, setup_cli_logger, stop_cevast_logger
 from cevast.analysis import ChainValidator
 from .dataset import DatasetRepository, DatasetSource, DatasetState, Dataset
 from .manager_factory import DatasetManagerFactory, DatasetInvalidError
@@ -127,6 +127,7 @@ def manager_group(ctx, directory, source, date, port, cpu):
     if ctx.parent is None:  # Check if was called diretly via "manager" alias and should set up logger then
         setup_cevast_logger(process_id=cpu > 1)
         setup_cli_logger()
+        ctx.call_on_close(stop_cevast_logger)
 
     try:
         manager = DatasetManagerFactory.get_manager(source)(repository=directory, date=date, ports=port, cpu_cores=cpu)
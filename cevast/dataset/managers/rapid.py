@@ -2,7 +2,6 @@
 
 import os
 import logging
-from collections import OrderedDict
 from datetime import datetime
 from typing import Tuple, Type
 from cevast.certdb import CertDB
@@ -38,6 +37,8 @@ class RapidDatasetManager(DatasetManager):
         self._ports = (ports,) if isinstance(ports, str) else ports
         self._cpu_cores = cpu_cores
         self.__date_id = date.strftime('%Y%m%d')
+        # Datasets are immutable for the lifetime of the manager, so they are initialized only once
+        self.__datasets = None
         log.info('RapidDatasetManager initialized with repository=%s, date=%s, ports=%s', repository, date, ports)
 
     def run(self, task_pipline: Tuple[Tuple[DatasetManagerTask, dict]]) -> None:
@@ -92,7 +93,7 @@ class RapidDatasetManager(DatasetManager):
             download_dir=download_dir, date=self._date, filter_ports=self._ports, filter_types=('hosts', 'certs')
         )
         # Remove duplicates (same datasets with e.g. different suffix)
-        datasets = tuple(OrderedDict.fromkeys(map(Dataset.from_full_path, collected)))
+        datasets = tuple(dict.fromkeys(map(Dataset.from_full_path, collected)))
         log.info('%d dataset were downloaded', len(datasets))
         log.info('Collecting finished')
         cli_log.info('Collecting finished')
@@ -114,7 +115,9 @@ class RapidDatasetManager(DatasetManager):
         return analysed if analysed else None
 
     def __init_datasets(self) -> Tuple[Dataset]:
-        return tuple(Dataset(self._repository, self.dataset_source, self.__date_id, port) for port in self._ports)
+        if self.__datasets is None:
+            self.__datasets = tuple(Dataset(self._repository, self.dataset_source, self.__date_id, port) for port in self._ports)
+        return self.__datasets
 
     def __init_unifier(self, dataset: Dataset) -> RapidUnifier:
         certs_file = dataset.full_path(DatasetState.COLLECTED, self._CERT_NAME_SUFFIX, True)
@@ -158,8 +161,9 @@ class RapidDatasetManager(DatasetManager):
                     # Store dataset unification log
                     unifier.save_unification_log(os.path.splitext(unifier.chain_file)[0] + '.log')
             except OSError:
-                log.exception("Error during hosts dataset parsing -> commit")
-                certdb.commit()
+                # Unification failed as a whole, so do not persist the certificates either (same as above)
+                log.exception("Error during hosts dataset parsing -> rollback")
+                certdb.rollback()
                 raise DatasetUnificationError("Error during hosts dataset parsing")
         # Remove unified datasets
         # for dataset in unifyable:
@@ -1,18 +1,77 @@
 """This module contains implementation of RAPID dataset source unifier."""
 
 import os
-import gzip
 import logging
 import json
-from contextlib import ExitStack
+import sys
+import queue
+import shutil
+import subprocess
+import threading
+from contextlib import ExitStack, closing
+
+try:
+    # Faster drop-in replacement of gzip (Intel ISA-L), if installed
+    from isal import igzip as gzip  # pylint: disable=import-error
+except ImportError:
+    import gzip
 from cevast.certdb import CertDB
-from cevast.utils import BASE64_to_PEM
+from cevast.utils import BASE64_to_PEM, iter_gz_lines
 from ..dataset import DatasetSource
 
 __author__ = 'Radim Podola'
 
 log = logging.getLogger(__name__)
 
+# Size of the buffers used to read and write gzipped dataset files
+BUFFER_SIZE = 2 ** 20
+# Number of certificates inserted to CertDB at once
+INSERT_BATCH_SIZE = 4096
+# Maximum number of parsed batches waiting for insertion to CertDB
+QUEUE_SIZE = 64
+# Parallel gzip used to compress the chain files, if available on the system
+PIGZ = shutil.which('pigz')
+
+
+def _gzip_writer(stack: ExitStack, filename: str):
+    """
+    Open gzipped file for binary writing, compressed data are written through a large buffer.
+    If `PIGZ` is available, data are compressed by the parallel pigz process through a pipe.
+    All the opened files are closed by `stack`.
+    """
+    w_file = stack.enter_context(open(filename, 'wb', buffering=BUFFER_SIZE))
+    if PIGZ:
+        proc = subprocess.Popen([PIGZ, '-c'], stdin=subprocess.PIPE, stdout=w_file, bufsize=BUFFER_SIZE)
+        # Wait for pigz to finish after its input is closed
+        stack.callback(_wait_for_compressor, proc, filename)
+        return stack.enter_context(proc.stdin)
+    return stack.enter_context(gzip.GzipFile(fileobj=w_file, mode='wb'))
+
+
+def _wait_for_compressor(proc: subprocess.Popen, filename: str) -> None:
+    """Wait for compressor process and raise OSError if it failed."""
+    if proc.wait() != 0:
+        raise OSError('Compression of file {} failed with code {}'.format(filename, proc.returncode))
+
+
+class _ChainBuffer:
+    """Output buffer collecting the chain lines, written to the gzipped `file` by `BUFFER_SIZE` blocks."""
+
+    def __init__(self, file):
+        self._file = file
+        self._buf = bytearray()
+
+    def write(self, line: bytes) -> None:
+        """Append line to the buffer and write the buffer to the file if it is full."""
+        self._buf.extend(line)
+        if len(self._buf) >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered lines to the file."""
+        self._file.write(self._buf)
+        self._buf.clear()
+
 
 # TODO metoda recalculate broken chain
 class RapidUnifier:
@@ -37,7 +96,9 @@ class RapidUnifier:
         self._hosts_dataset = hosts_dataset
         self._chain_file = chain_file
         self._broken_chain_file = broken_chain_file
-        # Initialize dataset unification log
+        # IDs (as bytes) of certificates known to be available in CertDB
+        self._available_certs = set()
+        # Initialize dataset unification log (insertion order is the order of the saved log)
         self.__unification_log = {
             'total_certs': 0,
             'total_hosts': 0,
@@ -72,87 +133,203 @@ class RapidUnifier:
         Tuple ('cert_id', 'certificate') is returned for each parsed certificated.
         """
         log.info('Start parsing certificates from dataset: %s', dataset)
-        with gzip.open(dataset, 'rt') as r_file:
-            for line in r_file:
-                yield [x.strip() for x in line.split(',')]
+        for line in iter_gz_lines(dataset, 'ascii'):
+            # Malformed record raises ValueError
+            sha, cert = line.split(',')
+            yield sha.strip(), cert.strip()
 
     @staticmethod
     def parse_chains(dataset: str) -> tuple:
         """
         Generator parsing host certificate records and building chains from dataset one by one.
         Tuple ('host IP', [certificate chain]) is returned for each parsed host IP.
+
+        Certificate IDs are interned, the same intermediate and root certificates share a single
+        string object with cached hash across all the chains.
         """
         log.info('Start parsing and building host chains from dataset: %s', dataset)
+        intern = sys.intern
         chain = []
         last = None
-        with gzip.open(dataset, 'rt') as r_file:
-            for line in r_file:
-                curr, sha = [x.strip() for x in line.split(',')]
-
-                if last and curr != last:
-                    yield last, chain
-                    chain.clear()
-                # Building the chain
-                chain.append(sha)
-                last = curr
-            yield last, chain
+        for line in iter_gz_lines(dataset, 'ascii'):
+            curr, sha = line.split(',')
+            curr, sha = curr.strip(), sha.strip()
+
+            if last and curr != last:
+                yield last, chain
+                chain.clear()
+            # Building the chain
+            chain.append(intern(sha))
+            last = curr
+        yield last, chain
 
     # TODO this one might be generic
     @staticmethod
     def read_chains(dataset: str) -> tuple:
         """
         Generator reading certificate chains from unified dataset one by one.
-        Tuple ('host IP', [certificate chain]) is returned for each host.
+        Tuple ('host IP', [certificate chain]) is returned for each host, certificate IDs are interned.
         """
         log.info('Start reading certificate chains from dataset: %s', dataset)
-        with gzip.open(dataset, 'rt') as r_file:
-            for line in r_file:
-                read_line = line.strip().split(',')
-                yield read_line[0], read_line[1:]
+        intern = sys.intern
+        for line in iter_gz_lines(dataset, 'ascii'):
+            read_line = line.strip().split(',')
+            yield read_line[0], [intern(sha) for sha in read_line[1:]]
+
+    def _produce_cert_batches(self, batches: queue.Queue, stop: threading.Event) -> None:
+        """
+        Parses certificates from dataset and puts them in batches into `batches` queue.
+
+        Queue is terminated by None, or by the exception raised during parsing.
+        """
+        to_pem = BASE64_to_PEM
+        try:
+            with closing(self.parse_certs(self._certs_dataset)) as certs:
+                batch = []
+                append = batch.append
+                for sha, cert in certs:
+                    append((sha, to_pem(cert)))
+                    if len(batch) == INSERT_BATCH_SIZE:
+                        if stop.is_set():
+                            return
+                        batches.put(batch)
+                        batch = []
+                        append = batch.append
+                if batch:
+                    batches.put(batch)
+            batches.put(None)
+        except Exception as exc:  # pylint: disable=W0703
+            batches.put(exc)
 
     def store_certs(self, certdb: CertDB) -> None:
-        """Parses certificates from dataset and stores them into CertDB."""
-        for sha, cert in self.parse_certs(self._certs_dataset):
-            certdb.insert(sha, BASE64_to_PEM(cert))
-            self.__unification_log['total_certs'] += 1
+        """
+        Parses certificates from dataset and stores them into CertDB.
+
+        Dataset is decompressed and parsed in a separate thread (zlib releases GIL),
+        while the parsed batches are inserted into CertDB in the calling thread.
+        """
+        batches = queue.Queue(maxsize=QUEUE_SIZE)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce_cert_batches, args=(batches, stop), daemon=True)
+        producer.start()
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                certdb.insert_many(batch)
+                self._available_certs.update(sha.encode() for sha, _ in batch)
+                self.__unification_log['total_certs'] += len(batch)
+        finally:
+            # Stop the producer and unblock it if waiting on full queue
+            stop.set()
+            while producer.is_alive():
+                try:
+                    batches.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            producer.join()
 
     def store_chains(self, certdb: CertDB) -> None:
         """
         Parses and builds certificate chains from dataset and stores them into the unified `chain_file` file.
 
         If `broken_chain_file` is provided, the chains that are not available (in the dataset nor the CertDB)
-        are stored into this separate file.
+        are stored into this separate file. Certificates stored by `store_certs` or already found in CertDB
+        are remembered, so CertDB is queried only for the rest of the chain.
+
+        Building of the chains is fused with writing - the chain line is assembled directly
+        in a reusable write buffer and written as soon as all host records are read. The lines are then
+        collected in per-file output buffers that are compressed at once by `BUFFER_SIZE` blocks.
         """
 
-        def write_chain(host: str, chain: list):
-            self.__unification_log['total_hosts'] += 1
-            line = host + ',' + ','.join(chain) + '\n'
-            if self._broken_chain_file:
-                # Try to find all the certificates in DB
-                if certdb.exists_all(chain):
-                    f_full_chains.write(line)
-                else:
-                    self.__unification_log['broken_chains'] += 1
-                    f_broken_chains.write(line)
+        def write_chain_full(line: bytearray, _chain_certs: set) -> None:
+            full_out.write(line)
+
+        def write_chain_split(line: bytearray, chain_certs: set) -> None:
+            nonlocal last_broken
+            # Try to find all the certificates in DB, the ones already found are not queried again
+            missing = frozenset(sha for sha in chain_certs if sha not in available_certs)
+            # Neighbouring hosts often share the same chain, do not query the same broken chain again
+            if not missing or (missing != last_broken and exists_all(sha.decode() for sha in missing)):
+                available_certs.update(missing)
+                full_out.write(line)
             else:
-                f_full_chains.write(line)
+                last_broken = missing
+                unification_log['broken_chains'] += 1
+                broken_out.write(line)
 
-        if not self._broken_chain_file:
-            self.__unification_log['broken_chains'] = -1
+        unification_log = self.__unification_log
+        available_certs = self._available_certs
+        exists_all = certdb.exists_all
+        if self._broken_chain_file:
+            write_chain = write_chain_split
+        else:
+            write_chain = write_chain_full
+            unification_log['broken_chains'] = -1
 
+        log.info('Start parsing and building host chains from dataset: %s', self._hosts_dataset)
+        last_broken, broken_out = None, None
         with ExitStack() as stack:
-            f_full_chains = stack.enter_context(gzip.open(self._chain_file, 'wt'))
+            full_out = _ChainBuffer(_gzip_writer(stack, self._chain_file))
             if self._broken_chain_file:
-                f_broken_chains = stack.enter_context(gzip.open(self._broken_chain_file, 'wt'))
+                broken_out = _ChainBuffer(_gzip_writer(stack, self._broken_chain_file))
+
+            hosts, host_certs = self._build_chains(write_chain)
+
+            full_out.flush()
+            if broken_out is not None:
+                broken_out.flush()
+
+        unification_log['total_hosts'] += hosts
+        unification_log['total_host_certs'] += host_certs
+
+    def _build_chains(self, write_chain) -> tuple:
+        """
+        Builds certificate chains from hosts dataset and passes each of them to `write_chain(line, chain_certs)`.
+        The chain line is assembled in a reusable write buffer, so it is valid only during the call.
+        Return tuple (number of hosts, number of host certificates).
+        """
+        writebuf = bytearray()
+        chain_certs = set()
+        # Bind methods used per record to locals
+        extend, add_cert = writebuf.extend, chain_certs.add
+        last = None
+        hosts, host_certs = 0, 0
+        for line in iter_gz_lines(self._hosts_dataset):
+            host, sha = line.split(b',')
+            host, sha = host.strip(), sha.strip()
+
+            if host != last:
+                # Writing the previous chain
+                if last is not None:
+                    extend(b'\n')
+                    write_chain(writebuf, chain_certs)
+                writebuf.clear()
+                extend(host)
+                chain_certs.clear()
+                last = host
+                hosts += 1
+            # Building the chain
+            extend(b',')
+            extend(sha)
+            add_cert(sha)
+            host_certs += 1
 
-            for host, chain in self.parse_chains(self._hosts_dataset):
-                self.__unification_log['total_host_certs'] += len(chain)
-                # Writing chain
-                write_chain(host, chain)
+        if last is not None:
+            extend(b'\n')
+            write_chain(writebuf, chain_certs)
+        return hosts, host_certs
 
     def save_unification_log(self, filename: str) -> None:
         """Save unification log to filename."""
-        log_str = json.dumps(self.unification_log, sort_keys=True, indent=4)
+        log_bytes = json.dumps(self.unification_log, indent=4).encode()
         log.info('Saving unification log: %s', filename)
-        with open(filename, 'w') as outfile:
-            outfile.write(log_str)
+        # The log is small, write it at once without Python-level buffering
+        fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, log_bytes)
+        finally:
+            os.close(fd)
@@ -6,9 +6,10 @@ __all__ = (
     'make_PEM_filename',
     'remove_empty_folders',
     'directory_with_prefix',
+    'iter_gz_lines',
 )
 __version__ = '1.1'
 __author__ = 'Radim Podola'
 
 from .cert_utils import validate_PEM, BASE64_to_PEM, make_PEM_filename
-from .os_utils import remove_empty_folders, directory_with_prefix
+from .os_utils import remove_empty_folders, directory_with_prefix, iter_gz_lines
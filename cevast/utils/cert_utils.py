@@ -1,7 +1,6 @@
 """
 This module provide functions supporting work with certificates.
 """
-import textwrap
 
 __author__ = 'Radim Podola'
 
@@ -13,7 +12,9 @@ def validate_PEM(cert: str) -> bool:
 
 def BASE64_to_PEM(cert: str) -> str:
     """Convert a raw BASE64 encoded certificate to PEM format (wrapped by 64 characters)"""
-    return '-----BEGIN CERTIFICATE-----' + '\n' + "\n".join(textwrap.wrap(cert, width=64)) + '\n' + '-----END CERTIFICATE-----'
+    # BASE64 contains no whitespace, so the lines are just fixed-size slices
+    body = '\n'.join([cert[i:i + 64] for i in range(0, len(cert), 64)])
+    return '-----BEGIN CERTIFICATE-----\n' + body + '\n-----END CERTIFICATE-----'
 
 
 def make_PEM_filename(cert_id: str) -> str:
@@ -4,6 +4,7 @@ This module contains an implementation of dataset enrichment analyser.
 
 import logging
 import os
+from collections import Counter
 from ..dataset.unifiers.rapid import RapidUnifier
 
 __author__ = 'Róbert Šuška'
@@ -29,86 +30,87 @@ class EnrichmentAnalyzer:
 
         self.__enrichment_depth = enrichment_depth
 
-        self.__cert_hashes = set()
-        self.__missing_cert_counts = {}
+        self.__cert_hashes = frozenset()
+        self.__missing_cert_counts = Counter()
         self.__sorted_missing_certs = []
+        self.__missing_cert_ranks = {}
+        self.__broken_chains = []
+        self.__broken_chain_bounds = []
         self.__broken_chain_counts_with_enrichments = {}
         self.__chain_count = 0
 
     def __parse_certs_file(self):
         cli_log.info("Parsing certs...")
 
-        self.__cert_hashes.clear()
-
-        for cert_hash, _ in RapidUnifier.parse_certs(self.__certs_file):
-            self.__cert_hashes.add(cert_hash)
+        self.__cert_hashes = frozenset(cert_hash for cert_hash, _ in RapidUnifier.parse_certs(self.__certs_file))
 
     def __count_missing_certs_in_chains(self):
         cli_log.info('Counting missing certs in chains...')
 
         self.__missing_cert_counts.clear()
+        self.__broken_chains.clear()
+        cert_hashes = self.__cert_hashes
+        count_missing_certs = self.__missing_cert_counts.update
+        add_broken_chain = self.__broken_chains.append
+        chain_count = 0
 
+        # Hosts file is parsed only once, missing certs of the broken chains are kept for the next pass
         for _, cert_hash_chain in RapidUnifier.parse_chains(self.__hosts_file):
-            for cert_hash in cert_hash_chain:
-                if cert_hash not in self.__cert_hashes:
-                    if cert_hash not in self.__missing_cert_counts:
-                        self.__missing_cert_counts[cert_hash] = 1
-                    else:
-                        self.__missing_cert_counts[cert_hash] += 1
+            missing_certs = tuple(cert_hash for cert_hash in cert_hash_chain if cert_hash not in cert_hashes)
+            if missing_certs:
+                count_missing_certs(missing_certs)
+                add_broken_chain(missing_certs)
+            chain_count += 1
+
+        self.__chain_count = chain_count
 
         cli_log.info('Sorting missing certs...')
 
-        self.__sorted_missing_certs = [cert_hash for cert_hash, count in sorted(self.__missing_cert_counts.items(), key=lambda item: item[1], reverse=True)]
+        # Only the most commonly missing certs up to the enrichment depth are used
+        self.__sorted_missing_certs = [cert_hash for cert_hash, _ in self.__missing_cert_counts.most_common(self.__enrichment_depth)]
+        # Rank of the missing cert = number of the most commonly missing certs added before it
+        self.__missing_cert_ranks = {cert_hash: rank for rank, cert_hash in enumerate(self.__sorted_missing_certs)}
 
     def __count_broken_chains_with_enrichments(self):
         cli_log.info('Counting broken chains with enrichments...')
 
         self.__broken_chain_counts_with_enrichments.clear()
-        self.__chain_count = 0
-
-        for _, cert_hash_chain in RapidUnifier.parse_chains(self.__hosts_file):
-            self.__determine_chain_completeness_with_enrichments(cert_hash_chain)
-            self.__chain_count += 1
-
-    def __determine_chain_completeness_with_enrichments(self, cert_hash_chain):
-        missing_certs = []
-
-        for cert_hash in cert_hash_chain:
-            if cert_hash not in self.__cert_hashes:
-                missing_certs.append(cert_hash)
-
-        if len(missing_certs) > 0:
-            if 0 not in self.__broken_chain_counts_with_enrichments:
-                self.__broken_chain_counts_with_enrichments[0] = 1
-            else:
-                self.__broken_chain_counts_with_enrichments[0] += 1
-
-            for i in range(1, min(self.__enrichment_depth + 1, len(self.__sorted_missing_certs) + 1)):
-                if not all(missing_cert in self.__sorted_missing_certs[:i] for missing_cert in missing_certs):
-                    if i not in self.__broken_chain_counts_with_enrichments:
-                        self.__broken_chain_counts_with_enrichments[i] = 1
-                    else:
-                        self.__broken_chain_counts_with_enrichments[i] += 1
-                else:
-                    break
+        self.__broken_chain_bounds = [0] * (len(self.__missing_cert_ranks) + 1)
+        missing_cert_ranks = self.__missing_cert_ranks
+        broken_chain_bounds = self.__broken_chain_bounds
+        not_enriched = len(missing_cert_ranks)
+
+        for missing_certs in self.__broken_chains:
+            # Chain gets complete only after adding the lowest ranked of its missing certs,
+            # so it stays broken for all the enrichment levels up to the rank of that cert
+            broken_chain_bounds[max(missing_cert_ranks.get(cert_hash, not_enriched) for cert_hash in missing_certs)] += 1
+
+        # Chain broken up to the enrichment level N is broken for all the lower levels as well
+        broken_chains = 0
+        for enrichment in reversed(range(len(self.__broken_chain_bounds))):
+            broken_chains += self.__broken_chain_bounds[enrichment]
+            if broken_chains > 0:
+                self.__broken_chain_counts_with_enrichments[enrichment] = broken_chains
 
     def __write_results(self):
         results_file_name = '{0}_enrichment_stats'.format('_'.join(os.path.basename(self.__certs_file).split('_')[:2]))
 
         cli_log.info('Writing results into \"{0}\"'.format(results_file_name))
 
-        with open(results_file_name, 'w') as results_file:
-            for cert_hash in self.__sorted_missing_certs[:self.__enrichment_depth]:
-                results_file.write('{0}\n'.format(cert_hash))
+        # Results are assembled first and written at once
+        lines = ['{0}\n'.format(cert_hash) for cert_hash in self.__sorted_missing_certs[:self.__enrichment_depth]]
 
-            cli_log.info('\nTotal chains: {0}\n'.format(self.__chain_count))
-            results_file.write('\nTotal chains: {0}\n\n'.format(self.__chain_count))
+        cli_log.info('\nTotal chains: {0}\n'.format(self.__chain_count))
+        lines.append('\nTotal chains: {0}\n\n'.format(self.__chain_count))
 
-            for enrichment in sorted(self.__broken_chain_counts_with_enrichments):
-                complete_chain_count = self.__chain_count - self.__broken_chain_counts_with_enrichments[enrichment]
+        for enrichment in sorted(self.__broken_chain_counts_with_enrichments):
+            complete_chain_count = self.__chain_count - self.__broken_chain_counts_with_enrichments[enrichment]
 
-                cli_log.info('Enrichment {0}: {1}% complete ({2})'.format(enrichment, round(complete_chain_count / self.__chain_count, 4), complete_chain_count))
-                results_file.write('{0},{1}\n'.format(enrichment, complete_chain_count))
+            cli_log.info('Enrichment {0}: {1}% complete ({2})'.format(enrichment, round(complete_chain_count / self.__chain_count, 4), complete_chain_count))
+            lines.append('{0},{1}\n'.format(enrichment, complete_chain_count))
+
+        with open(results_file_name, 'w') as results_file:
+            results_file.write(''.join(lines))
 
     def run(self):
         """
@@ -5,26 +5,49 @@ This module contains helper functions for project logging.
 import os
 import sys
 import gzip
+import shutil
 import logging
 import logging.handlers
+import threading
+import multiprocessing
 
 __author__ = 'Radim Podola'
 
 LOG_DIR = './log'
 LOG_FILENAME = 'cevast.log'
 
+# Maximum time [s] to wait for the listener to write out the remaining records of the worker processes
+LOG_STOP_TIMEOUT = 10
+
+# Queue passing the records of worker processes to the listener thread of the main process (if multiple processes log)
+_LOG_QUEUE = None
+_LOG_LISTENER = None
+
 
 def __namer(name):
     return name + ".gz"
 
 
 def __rotator(source, dest):
+    # Fastest compression level, rotation blocks the logging of the whole process
     with open(source, "rb") as src:
-        with gzip.open(dest, "wb") as trg:
-            trg.writelines(src)
+        with gzip.open(dest, "wb", compresslevel=1) as trg:
+            shutil.copyfileobj(src, trg, 2 ** 20)
     os.remove(source)
 
 
+def __listen(queue, handler):
+    """Write the records of worker processes received from `queue` until None is received."""
+    while True:
+        try:
+            record = queue.get()
+        except (EOFError, OSError):
+            break  # queue closed at exit
+        if record is None:
+            break
+        handler.handle(record)
+
+
 def cli_logger() -> logging.Logger:
     return logging.getLogger('CEVAST_CLI')
 
@@ -52,7 +75,6 @@ def setup_cli_logger() -> logging.Logger:
     return cli_logger
 
 
-# TODO fix problem with mp logging https://medium.com/@rui.jorge.rei/semi-correct-handling-of-log-rotation-in-multiprocess-python-applications-75c56eca6780
 def setup_cevast_logger(debug: bool = False, process_id: bool = False) -> logging.Logger:
     """
     Setup the project logger 'CEVAST'.
@@ -61,10 +83,16 @@ def setup_cevast_logger(debug: bool = False, process_id: bool = False) -> loggin
         - console_handler to write error-like logs to stdout (>= WARNING)
         - file_handler to write logs into rotating file with compression of rotated files
 
+    If `process_id` is set (multiple processes will log), the records of worker processes are passed
+    through a queue to a listener thread writing them by the file_handler, so the processes do not
+    compete for the log file and its rotation. Worker pools attach the queue by `setup_worker_logger`
+    as their initializer, the listener is stopped by `stop_cevast_logger` after the pools are joined.
+
     Each module-level logger must start with 'cevast.' to inherit the setup.
 
     TODO: add support for config file
     """
+    global _LOG_QUEUE, _LOG_LISTENER  # pylint: disable=global-statement
     if not os.path.exists(LOG_DIR):
         os.mkdir(LOG_DIR)
 
@@ -98,5 +126,48 @@ def setup_cevast_logger(debug: bool = False, process_id: bool = False) -> loggin
     logger.setLevel(logging.DEBUG if debug else logging.INFO)
     logger.addHandler(file_handler)
     # logger.addHandler(console_handler)
+    if process_id:
+        # Main process keeps writing to the file directly, so it never waits for the queue
+        _LOG_QUEUE = multiprocessing.Queue(-1)
+        _LOG_LISTENER = threading.Thread(target=__listen, args=(_LOG_QUEUE, file_handler), daemon=True)
+        _LOG_LISTENER.start()
 
     return logger
+
+
+def get_log_queue():
+    """Return the queue of the listener set up by `setup_cevast_logger`, or None if processes log on their own."""
+    return _LOG_QUEUE
+
+
+def setup_worker_logger(queue, level: int) -> logging.Logger:
+    """
+    Setup the project logger 'CEVAST' in a worker process to pass the records through `queue`
+    to the listener of the main process. Meant as (a part of) the initializer of worker pools.
+    """
+    logger = logging.getLogger('cevast')
+    logger.setLevel(level)
+    # Drop the handlers inherited from the main process
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(logging.handlers.QueueHandler(queue))
+    return logger
+
+
+def stop_cevast_logger() -> None:
+    """
+    Stop the listener set up by `setup_cevast_logger` after the worker pools are joined.
+
+    The remaining records are written out. If a terminated worker left the queue locked,
+    the listener is abandoned after `LOG_STOP_TIMEOUT` seconds instead of blocking the exit.
+    """
+    global _LOG_QUEUE, _LOG_LISTENER  # pylint: disable=global-statement
+    if _LOG_LISTENER is None:
+        return
+    _LOG_QUEUE.put(None)
+    _LOG_LISTENER.join(LOG_STOP_TIMEOUT)
+    if _LOG_LISTENER.is_alive():
+        _LOG_QUEUE.cancel_join_thread()
+    _LOG_QUEUE.close()
+    _LOG_QUEUE.join_thread()
+    _LOG_QUEUE, _LOG_LISTENER = None, None
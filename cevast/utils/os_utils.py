@@ -4,18 +4,27 @@ This module provide functions supporting work with OS.
 import os
 import sys
 
+try:
+    # Faster drop-in replacement of zlib (Intel ISA-L), if installed
+    from isal import isal_zlib as zlib  # pylint: disable=import-error
+except ImportError:
+    import zlib
+
 __author__ = 'Radim Podola'
 
+# zlib window bits of gzip format (with gzip header and trailer)
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
 
 def remove_empty_folders(path: str):
     """Recursively remove empty folders"""
-    files = os.listdir(path)
-    if files:
-        # Remove empty subfolders
-        for file in files:
-            fullpath = os.path.join(path, file)
-            if os.path.isdir(fullpath):
-                remove_empty_folders(fullpath)
+    with os.scandir(path) as iterator:
+        entries = list(iterator)
+    if entries:
+        # Remove empty subfolders, DirEntry knows its type from the listing so no extra stat is needed
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                remove_empty_folders(entry.path)
     else:
         os.rmdir(path)
 
@@ -25,12 +34,69 @@ def directory_with_prefix(directory: str, prefix: str, filename_only: bool = Fal
     # Check if the directory exists
     if os.path.exists(directory):
         # Check if there is any file matching the prefix
-        for file in sorted(os.listdir(directory)):
-            if file.startswith(prefix):
-                if filename_only:
-                    yield file
+        with os.scandir(directory) as iterator:
+            entries = sorted((entry.name, entry.path) for entry in iterator if entry.name.startswith(prefix))
+        for file, path in entries:
+            if filename_only:
+                yield file
+            else:
+                yield path
+
+
+def _decompress_gz_chunk(decompressor, chunk: bytes) -> tuple:
+    """
+    Decompress `chunk` of gzipped file by `decompressor`, continuing with the next members of multi-member file.
+    Zero padding after a member is skipped as gzip module does.
+    Return tuple (decompressor of the current member, decompressed data).
+    """
+    data = b''
+    try:
+        while chunk:
+            if decompressor.eof:
+                chunk = chunk.lstrip(b'\x00')
+                if not chunk:
+                    break
+                decompressor = zlib.decompressobj(GZIP_WBITS)
+            data += decompressor.decompress(chunk)
+            chunk = decompressor.unused_data
+    except zlib.error as exc:
+        # Be consistent with gzip module that raises OSError on corrupted file
+        raise OSError(str(exc)) from exc
+    return decompressor, data
+
+
+def iter_gz_lines(filename: str, encoding: str = None, chunk_size: int = 2 ** 20):
+    """
+    Generator reading gzipped file by large chunks and returning its lines one by one (without line ends).
+
+    Lines are returned as bytes, or as strings decoded with `encoding` if provided.
+    Data are decompressed by `zlib` directly and split into lines chunk-wise by C-implemented split.
+    """
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    pending = b''
+    compressed = False
+    with open(filename, 'rb') as r_file:
+        while True:
+            chunk = r_file.read(chunk_size)
+            if not chunk:
+                break
+            compressed = True
+            decompressor, data = _decompress_gz_chunk(decompressor, chunk)
+            data = pending + data
+            # Split only complete lines, the rest waits for the next chunk
+            end = data.rfind(b'\n') + 1
+            pending = data[end:]
+            if end:
+                lines = data[:end - 1]
+                if encoding:
+                    lines = lines.decode(encoding)
+                    yield from lines.split('\n')
                 else:
-                    yield os.path.join(directory, file)
+                    yield from lines.split(b'\n')
+    if compressed and not decompressor.eof:
+        raise EOFError('Compressed file ended before the end-of-stream marker was reached')
+    if pending:
+        yield pending.decode(encoding) if encoding else pending
 
 
 if __name__ == "__main__":
@@ -6,87 +6,153 @@ Run as:> python3 -m cProfile -s calls cert_file_db.py {storage} {10000_certs.gz}
 
 import sys
 import time
+import functools
 import shutil
+import pickle
+import tempfile
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from itertools import islice, repeat
 import cevast.dataset.unifiers as unifier
 from cevast.certdb import CertFileDB, CertFileDBReadOnly
 from cevast.utils.cert_utils import BASE64_to_PEM
-from cevast.utils.logging import setup_cevast_logger
-
-setup_cevast_logger(debug=True, process_id=True)
-
-storage = sys.argv[1]
-dataset = sys.argv[2]
-try:
-    cpus = sys.argv[3]
-except IndexError:
-    cpus = 1
-certs = []
-
-try:
-    certdb = CertFileDB(storage, cpus)
-except ValueError:
-    CertFileDB.setup(storage, owner='cevast', desc='Cevast CertFileDB for performance tests')
-    certdb = CertFileDB(storage, cpus)
-
-certdb_rdonly = CertFileDBReadOnly(storage)
-
-print("Benchmark: %s" % __file__)
-print("Dataset: %s" % dataset)
-print("CPUs used: %s" % cpus)
-print()
-print("Started insert:")
-t0 = time.time()
-for sha, cert in unifier.RapidUnifier.parse_certs(dataset):
-    certdb.insert(sha, BASE64_to_PEM(cert))
-    certs.append(sha)
-print("Finished: %r" % (time.time() - t0))
-print()
-print("Check every cert for existance:")
-t0 = time.time()
-assert certdb.exists_all(certs)
-print("Finished: %r" % (time.time() - t0))
-print()
-print("Started rollback: ")
-t0 = time.time()
-certdb.rollback()
-print("Finished: %r" % (time.time() - t0))
-print()
-print("Started 2nd insert:")
-t0 = time.time()
-for sha, cert in unifier.RapidUnifier.parse_certs(dataset):
-    certdb.insert(sha, BASE64_to_PEM(cert))
-print("Finished: %r" % (time.time() - t0))
-print()
-print("Started commit: ")
-t0 = time.time()
-certdb.commit()
-print("Finished: %r" % (time.time() - t0))
-print()
-print("Check every cert for existance (ReadOnly):")
-t0 = time.time()
-assert certdb_rdonly.exists_all(certs)
-print("Finished: %r" % (time.time() - t0))
-print()
-print("Check every cert for existance 2nd time (ReadOnly):")
-t0 = time.time()
-assert certdb_rdonly.exists_all(certs)
-print("Finished: %r" % (time.time() - t0))
-print()
-print("Started get:")
-t0 = time.time()
-for cert in certs:
-    certdb.get(cert)
-print("Finished: %r" % (time.time() - t0))
-print()
-print("Started delete every 2nd cert: ")
-t0 = time.time()
-for cert in certs[::2]:
-    certdb.delete(cert)
-print("Finished: %r" % (time.time() - t0))
-print()
-print("Started commit: ")
-t0 = time.time()
-certdb.commit()
-print("Finished: %r" % (time.time() - t0))
-
-shutil.rmtree(storage, ignore_errors=True)
+from cevast.utils.logging import setup_cevast_logger, stop_cevast_logger
+
+
+def batched(iterable, size):
+    """Yield lists of `size` items from `iterable`, the last one may be shorter."""
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def spooled_batches(spool):
+    """Yield batches pickled into `spool` file object from its beginning."""
+    spool.seek(0)
+    while True:
+        try:
+            yield pickle.load(spool)
+        except EOFError:
+            return
+
+
+def get_batch(certdb, cert_ids):
+    """Get every certificate from `cert_ids`, run by the reader threads."""
+    get = certdb.get
+    for cert_id in cert_ids:
+        get(cert_id)
+
+
+def _to_pem(record):
+    """Convert parsed certificate record to (cert_id, PEM) pair, run by the pool workers if more CPUs are used."""
+    sha, cert = record
+    return sha, BASE64_to_PEM(cert)
+
+
+def main():
+    """Run the benchmark."""
+    setup_cevast_logger(debug=True, process_id=True)
+
+    storage = sys.argv[1]
+    dataset = sys.argv[2]
+    try:
+        cpus = sys.argv[3]
+    except IndexError:
+        cpus = 1
+    certs = []
+
+    try:
+        certdb = CertFileDB(storage, cpus)
+    except ValueError:
+        CertFileDB.setup(storage, owner='cevast', desc='Cevast CertFileDB for performance tests')
+        certdb = CertFileDB(storage, cpus)
+
+    certdb_rdonly = CertFileDBReadOnly(storage)
+    # Certificates are converted to PEM in parallel, CertFileDB transaction stays in this process.
+    # Single CPU converts them directly, so the results stay comparable with the previous ones
+    pool = mp.Pool(int(cpus)) if int(cpus) > 1 else None
+    convert = functools.partial(pool.imap, chunksize=512) if pool is not None else map
+    # Converted certificates are spooled so the 2nd insert measures CertFileDB only
+    spool = tempfile.TemporaryFile()
+
+    print("Benchmark: %s" % __file__)
+    print("Dataset: %s" % dataset)
+    print("CPUs used: %s" % cpus)
+    print()
+    # Warm up the parser, pool workers and CertFileDB with a single certificate before timing
+    with closing(unifier.RapidUnifier.parse_certs(dataset)) as records:
+        for sha, cert in convert(_to_pem, islice(records, 1)):
+            certdb.insert(sha, cert)
+    certdb.rollback()
+    print("Started insert:")
+    t0 = time.perf_counter()
+    for batch in batched(convert(_to_pem, unifier.RapidUnifier.parse_certs(dataset)), 1024):
+        certdb.insert_many(batch)
+        certs.extend(sha for sha, _ in batch)
+        pickle.dump(batch, spool, pickle.HIGHEST_PROTOCOL)
+    print("Finished: %r" % (time.perf_counter() - t0))
+    print()
+    # Certificates sorted by ID are looked up block by block, sorted in place to keep a single list
+    certs.sort()
+    print("Check every cert for existance:")
+    t0 = time.perf_counter()
+    assert certdb.exists_all(certs)
+    print("Finished: %r" % (time.perf_counter() - t0))
+    print()
+    print("Started rollback: ")
+    t0 = time.perf_counter()
+    certdb.rollback()
+    print("Finished: %r" % (time.perf_counter() - t0))
+    print()
+    print("Started 2nd insert:")
+    t0 = time.perf_counter()
+    for batch in spooled_batches(spool):
+        certdb.insert_many(batch)
+    print("Finished: %r" % (time.perf_counter() - t0))
+    print()
+    print("Started commit: ")
+    t0 = time.perf_counter()
+    certdb.commit()
+    print("Finished: %r" % (time.perf_counter() - t0))
+    print()
+    print("Check every cert for existance (ReadOnly):")
+    t0 = time.perf_counter()
+    assert certdb_rdonly.exists_all(certs)
+    print("Finished: %r" % (time.perf_counter() - t0))
+    print()
+    print("Check every cert for existance 2nd time (ReadOnly):")
+    t0 = time.perf_counter()
+    assert certdb_rdonly.exists_all(certs)
+    print("Finished: %r" % (time.perf_counter() - t0))
+    print()
+    print("Started get:")
+    t0 = time.perf_counter()
+    # Several block archives are read at once, zlib releases the GIL while decompressing
+    with ThreadPoolExecutor(int(cpus) * 4) as readers:
+        for _ in readers.map(get_batch, repeat(certdb), batched(certs, 1024)):
+            pass
+    print("Finished: %r" % (time.perf_counter() - t0))
+    print()
+    print("Started delete every 2nd cert: ")
+    t0 = time.perf_counter()
+    certdb.delete_many(certs[::2])
+    print("Finished: %r" % (time.perf_counter() - t0))
+    print()
+    print("Started commit: ")
+    t0 = time.perf_counter()
+    certdb.commit()
+    print("Finished: %r" % (time.perf_counter() - t0))
+
+    spool.close()
+    if pool is not None:
+        pool.close()
+        pool.join()
+    stop_cevast_logger()
+    shutil.rmtree(storage, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,7 @@ import time
 from cevast.dataset.unifiers import RapidUnifier
 from cevast.analysis import ChainValidator
 from cevast.certdb import CertFileDB
-from cevast.utils.logging import setup_cevast_logger
+from cevast.utils.logging import setup_cevast_logger, stop_cevast_logger
 
 
 log = setup_cevast_logger(debug=True, process_id=True)
@@ -35,11 +35,12 @@ print("Dataset: %s" % chain_file)
 print("CPUs used: %s" % cpus)
 print()
 print("Started validation:")
-t0 = time.time()
+t0 = time.perf_counter()
 # Open validator as context manager
 with ChainValidator(filename, cpus, **{'certdb': certdb}) as validator_ctx:
     for host, chain in RapidUnifier.read_chains(chain_file):
         validator_ctx.schedule(host, chain)
     # Indicate that no more validation data will be scheduled
     validator_ctx.done()
-print("Finished: %r" % (time.time() - t0))
+print("Finished: %r" % (time.perf_counter() - t0))
+stop_cevast_logger()
@@ -0,0 +1,43 @@
+"""
+    This modul contains script running a benchmark script with increasing number of CPUs to find the fastest setup
+
+Run as:> python3 sweep.py {benchmark_script} {storage} {dataset} > profiles/{commit}_sweep_{benchmark}
+"""
+
+import os
+import sys
+import time
+import subprocess
+
+
+def cpu_counts(limit: int) -> list:
+    """Return powers of two up to `limit` (including `limit` itself)."""
+    counts = []
+    cpus = 1
+    while cpus < limit:
+        counts.append(cpus)
+        cpus *= 2
+    counts.append(limit)
+    return counts
+
+
+def main():
+    """Run the benchmark script once for each number of CPUs and print the fastest one."""
+    script = sys.argv[1]
+    args = sys.argv[2:4]
+    results = {}
+
+    print("Sweep: %s" % script)
+    print()
+    for cpus in cpu_counts(os.cpu_count() or 1):
+        print("Started with %d CPUs:" % cpus)
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, script] + args + [str(cpus)], stdout=subprocess.DEVNULL, check=True)
+        results[cpus] = time.perf_counter() - t0
+        print("Finished: %r" % results[cpus])
+        print()
+    print("Fastest with %d CPUs" % min(results, key=results.get))
+
+
+if __name__ == "__main__":
+    main()
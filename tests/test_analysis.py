@@ -0,0 +1,85 @@
+"""
+This module contains unit tests of cevast.analysis package.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import unittest
+import unittest.mock
+from cevast.utils import BASE64_to_PEM
+from cevast.dataset.unifiers import RapidUnifier
+from cevast.analysis.modules.validation_clients import openssl
+from cevast.analysis.modules.validation_clients.openssl import Openssl
+
+TEST_DATA_PATH = 'tests/data/'
+TEST_CERTS = TEST_DATA_PATH + '3-certs.gz'
+
+
+class TestOpenssl(unittest.TestCase):
+    """Unit test class of Openssl validation client"""
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        # Trust store with a plain and a trusted certificate
+        certs = [BASE64_to_PEM(cert) for _, cert in RapidUnifier.parse_certs(TEST_CERTS)][:2]
+        self.trust_store = os.path.join(self._tmp_dir, 'cert.pem')
+        with open(self.trust_store, 'w') as w_file:
+            w_file.write(certs[0] + '\n')
+            w_file.write(certs[1].replace('CERTIFICATE-----', 'TRUSTED CERTIFICATE-----') + '\n')
+        # Hashed CA directories are created in the test directory
+        self._tempdir = unittest.mock.patch.object(tempfile, 'tempdir', self._tmp_dir)
+        self._tempdir.start()
+        Openssl._get_ca_path.cache_clear()
+
+    def tearDown(self):
+        Openssl._get_ca_path.cache_clear()
+        self._tempdir.stop()
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    @unittest.skipIf(shutil.which('openssl') is None, 'openssl is not installed')
+    def test_ca_path(self):
+        """Test of the hashed CA directory created from trust store."""
+        ca_path = Openssl._get_ca_path(self.trust_store)
+        self.assertEqual(os.path.dirname(ca_path), self._tmp_dir)
+        # Both certificates with their hash links
+        self.assertEqual(len(os.listdir(ca_path)), 4)
+        # Directory is created only once
+        self.assertEqual(Openssl._get_ca_path(self.trust_store), ca_path)
+
+    @unittest.skipIf(shutil.which('openssl') is None, 'openssl is not installed')
+    def test_ca_path_removed_at_exit(self):
+        """Test that the hashed CA directory is removed when the process exits."""
+        code = 'import sys; from cevast.analysis.modules.validation_clients.openssl import Openssl; ' \
+               'print(Openssl._get_ca_path(sys.argv[1]))'
+        output = subprocess.check_output([sys.executable, '-c', code, self.trust_store], env=dict(os.environ, TMPDIR=self._tmp_dir))
+        ca_path = output.decode().strip()
+        self.assertTrue(ca_path.startswith(os.path.join(self._tmp_dir, 'cevast_openssl_ca_')))
+        assert not os.path.exists(ca_path)
+
+    def test_ca_path_fallback(self):
+        """Test of falling back to the trust store file if the hashed CA directory cannot be created."""
+        error = subprocess.CalledProcessError(1, ['openssl', 'rehash'])
+        with unittest.mock.patch.object(openssl.subprocess, 'check_output', side_effect=error) as check_output:
+            self.assertIsNone(Openssl._get_ca_path(self.trust_store))
+            self.assertEqual(check_output.call_args[0][0][:2], ['openssl', 'rehash'])
+        # Incomplete directory is removed
+        self.assertEqual(os.listdir(self._tmp_dir), ['cert.pem'])
+        # Missing trust store
+        self.assertIsNone(Openssl._get_ca_path(self.trust_store + 'x'))
+        self.assertEqual(os.listdir(self._tmp_dir), ['cert.pem'])
+
+        # Validation uses the trust store file then
+        with unittest.mock.patch.object(Openssl, 'TRUST_STORE_FILE', self.trust_store + 'x'),\
+             unittest.mock.patch.object(openssl.subprocess, 'check_output') as check_output:
+            self.assertEqual(Openssl.verify(['chain.pem']), [0])
+            command = check_output.call_args[0][0]
+        self.assertEqual(command[:2], ['openssl', 'verify'])
+        self.assertEqual(command[command.index('-CAfile') + 1], self.trust_store + 'x')
+        self.assertNotIn('-CApath', command)
+
+
+if __name__ == '__main__':
+    unittest.main()
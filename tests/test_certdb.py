@@ -1,18 +1,26 @@
 """
 This module contains white-box unit tests of CertDB package
+
+Every test works in its own temporary directory, so the tests can run in parallel (e.g. `pytest -n auto`).
 """
 # pylint: disable=W0212, C0103, C0302
 import sys
 import os
-import subprocess
+import gc
 import time
 import shutil
+import tempfile
 import string
 import random
 import unittest
 import unittest.mock
-from collections import OrderedDict
+import functools
+from collections import defaultdict
 import toml
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
 from cevast.utils import make_PEM_filename
 from cevast.certdb import (
     CertDB,
@@ -28,6 +36,26 @@ from cevast.certdb import (
 TEST_DATA_PATH = 'tests/data/'
 TEST_CERTS_1 = TEST_DATA_PATH + 'test_certs_1.csv'
 TEST_CERTS_2 = TEST_DATA_PATH + 'test_certs_2.csv'
+# Test storages are created on tmpfs if available
+TEST_TMP_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def load_toml(path: str) -> dict:
+    """Load TOML file with the faster stdlib parser if available."""
+    if tomllib is None:
+        return toml.load(path)
+    with open(path, 'rb') as r_file:
+        return tomllib.load(r_file)
+
+
+@functools.lru_cache(maxsize=None)
+def load_test_certs(certs_file: str) -> tuple:
+    """
+    Load certificates from certs_file, the file is read only once
+    Return tuple of (certificate ID, certificate) pairs.
+    """
+    with open(certs_file) as r_file:
+        return tuple(tuple(e.strip() for e in line.split(',')) for line in r_file.read().splitlines())
 
 
 def insert_test_certs(database: CertDB, certs_file: str) -> list:
@@ -35,14 +63,9 @@ def insert_test_certs(database: CertDB, certs_file: str) -> list:
     Insert certificates from certs_file to database
     Return list of inserted certificates.
     """
-    certs = []
-    with open(certs_file) as r_file:
-        for line in r_file:
-            els = [e.strip() for e in line.split(',')]
-            database.insert(els[0], els[1])
-            certs.append(els[0])
-
-    return certs
+    certs = load_test_certs(certs_file)
+    database.insert_many(certs)
+    return [cert_id for cert_id, _ in certs]
 
 
 def insert_random_certs(database: CertDB, certs_cnt: int) -> list:
@@ -52,7 +75,7 @@ def insert_random_certs(database: CertDB, certs_cnt: int) -> list:
     """
 
     def random_string(length: int) -> str:
-        return ''.join(random.choice(string.ascii_letters) for i in range(length))
+        return ''.join(random.choices(string.ascii_letters, k=length))
 
     certs = []
     for _ in range(certs_cnt):
@@ -68,16 +91,31 @@ def delete_test_certs(database: CertDB, certs_file: str) -> list:
     Delete certificates from certs_file from database
     Return list of deleted certificates.
     """
-    certs = []
-    with open(certs_file) as r_file:
-        for line in r_file:
-            els = [e.strip() for e in line.split(',')]
-            database.delete(els[0])
-            certs.append(els[0])
-
+    certs = [cert_id for cert_id, _ in load_test_certs(certs_file)]
+    database.delete_many(certs)
     return certs
 
 
+def missing_cert_files(database: CertFileDB, certs: list) -> set:
+    """
+    Find certificates from certs without a file in their block directory of database
+    Every block directory is listed only once.
+    Return set of missing certificates.
+    """
+    blocks = defaultdict(list)
+    for cert in certs:
+        blocks[database._get_block_path(cert)].append(cert)
+    missing = set()
+    for block_path, block_certs in blocks.items():
+        try:
+            existing = set(os.listdir(block_path))
+        except FileNotFoundError:
+            existing = set()
+        missing.update(cert for cert in block_certs if cert not in existing)
+
+    return missing
+
+
 def commit_test_certs(database: CertDB, certs_file: str) -> list:
     """
     Insert and commit certificates from certs_file to database
@@ -91,11 +129,13 @@ def commit_test_certs(database: CertDB, certs_file: str) -> list:
 class TestCertFileDBReadOnly(unittest.TestCase):
     """Unit test class of CertFileDBReadOnly class"""
 
-    TEST_STORAGE = 'tests/test_storage'
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp(dir=TEST_TMP_DIR)
+        self.TEST_STORAGE = os.path.join(self._tmp_dir, 'test_storage')
 
     def tearDown(self):
         # Clear test storage
-        shutil.rmtree(self.TEST_STORAGE, ignore_errors=True)
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
 
     def test_setup(self):
         """
@@ -106,8 +146,8 @@ class TestCertFileDBReadOnly(unittest.TestCase):
         # Setup and check DB
         CertFileDBReadOnly.setup(self.TEST_STORAGE, 5, 'DES', 'Testing DB', 'unittest')
         assert os.path.exists(self.TEST_STORAGE)
-        cfg = toml.load(os.path.join(self.TEST_STORAGE, CertFileDBReadOnly.CONF_FILENAME))
-        meta = toml.load(os.path.join(self.TEST_STORAGE, CertFileDBReadOnly.META_FILENAME))
+        cfg = load_toml(os.path.join(self.TEST_STORAGE, CertFileDBReadOnly.CONF_FILENAME))
+        meta = load_toml(os.path.join(self.TEST_STORAGE, CertFileDBReadOnly.META_FILENAME))
         self.assertEqual(cfg['PARAMETERS']['storage'], os.path.abspath(self.TEST_STORAGE))
         self.assertEqual(cfg['PARAMETERS']['structure_level'], 5)
         self.assertEqual(cfg['PARAMETERS']['cert_format'], 'DES')
@@ -144,17 +184,15 @@ class TestCertFileDBReadOnly(unittest.TestCase):
         """
         Test implementation of CertDB method GET
         """
-        CertFileDBReadOnly.setup(self.TEST_STORAGE, maintain_info=False)
+        CertFileDBReadOnly.setup(self.TEST_STORAGE, structure_level=1, maintain_info=False)
         db = CertFileDB(self.TEST_STORAGE)
         db_ronly = CertFileDBReadOnly(self.TEST_STORAGE)
         fake_cert_id = 'fakecertid'
         # Insert and commit some certificates and try to retrieve them back
         commit_test_certs(db, TEST_CERTS_1)
-        with open(TEST_CERTS_1) as r_file:
-            for line in r_file:
-                cert_id, cert = line.split(',')
-                # Certificates should exists - transaction was committed
-                self.assertEqual(db_ronly.get(cert_id), cert.strip())
+        # Certificates should exists - transaction was committed
+        certs = load_test_certs(TEST_CERTS_1)
+        self.assertEqual([db_ronly.get(cert_id) for cert_id, _ in certs], [cert for _, cert in certs])
         # Only insert other certificates and try to retrieve them back
         inserted = insert_test_certs(db, TEST_CERTS_2)
         for cert_id in inserted:
@@ -171,15 +209,17 @@ class TestCertFileDBReadOnly(unittest.TestCase):
         def test_permission(db, valid_cert_id):
             if not sys.platform.startswith('linux'):
                 return  # works only on Linux like systems
-            fake_target_dir = 'tests/fake_export'
+            if os.geteuid() == 0:
+                return  # root can write regardless of permissions
+            fake_target_dir = os.path.join(self._tmp_dir, 'fake_export')
 
             os.mkdir(fake_target_dir)
-            subprocess.call(['chmod', '-w', fake_target_dir])
+            os.chmod(fake_target_dir, 0o555)
             self.assertRaises(PermissionError, db.export, valid_cert_id, fake_target_dir)
-            subprocess.call(['chmod', '+w', fake_target_dir])
+            os.chmod(fake_target_dir, 0o755)
             os.rmdir(fake_target_dir)
 
-        CertFileDBReadOnly.setup(self.TEST_STORAGE, maintain_info=False)
+        CertFileDBReadOnly.setup(self.TEST_STORAGE, structure_level=1, maintain_info=False)
         db = CertFileDB(self.TEST_STORAGE)
         db_ronly = CertFileDBReadOnly(self.TEST_STORAGE)
         target_dir = self.TEST_STORAGE + '/export'
@@ -187,17 +227,17 @@ class TestCertFileDBReadOnly(unittest.TestCase):
         fake_cert_id = 'fakecertid'
         # Insert and commit some certificates and export them
         commit_test_certs(db, TEST_CERTS_1)
-        with open(TEST_CERTS_1) as r_file:
-            for line in r_file:
-                cert_id, cert = line.split(',')
-                expected = os.path.join(target_dir, make_PEM_filename(cert_id))
-                self.assertEqual(db_ronly.export(cert_id, target_dir), expected)
-                with open(expected) as target:
-                    self.assertEqual(target.read(), cert.strip())
-                # Check export without unnecessary copying - should copy anyway because persisted
-                self.assertEqual(db_ronly.export(cert_id, target_dir, copy_if_exists=False), expected)
+        for cert_id, cert in load_test_certs(TEST_CERTS_1):
+            expected = os.path.join(target_dir, make_PEM_filename(cert_id))
+            self.assertEqual(db_ronly.export(cert_id, target_dir), expected)
+            with open(expected) as target:
+                self.assertEqual(target.read(), cert)
+        # Check export without unnecessary copying - should copy anyway because persisted
+        persisted_id = load_test_certs(TEST_CERTS_1)[-1][0]
+        expected = os.path.join(target_dir, make_PEM_filename(persisted_id))
+        self.assertEqual(db_ronly.export(persisted_id, target_dir, copy_if_exists=False), expected)
         # Tests writing permissions for exporting from zipfile
-        test_permission(db_ronly, cert_id)
+        test_permission(db_ronly, persisted_id)
         # Only insert other certificates and try to retrieve them back
         inserted = insert_test_certs(db, TEST_CERTS_2)
         for cert_id in inserted:
@@ -211,7 +251,7 @@ class TestCertFileDBReadOnly(unittest.TestCase):
         """
         Test implementation of CertDB method EXISTS
         """
-        CertFileDBReadOnly.setup(self.TEST_STORAGE, maintain_info=False)
+        CertFileDBReadOnly.setup(self.TEST_STORAGE, structure_level=1, maintain_info=False)
         db = CertFileDB(self.TEST_STORAGE)
         db_ronly = CertFileDBReadOnly(self.TEST_STORAGE)
         fake_cert = 'fakecertid'
@@ -229,12 +269,16 @@ class TestCertFileDBReadOnly(unittest.TestCase):
         committed.append(fake_cert)
         assert not db_ronly.exists(fake_cert)
         assert not db_ronly.exists_all(committed)
+        # Test fake certificate from the same block as existing ones
+        fake_cert = committed[0] + 'fake'
+        assert not db_ronly.exists_all(sorted(committed[:-1] + [fake_cert]))
+        assert db_ronly.exists_all(sorted(committed[:-1]))
 
     def test_cache(self):
         """
         Test implementation of CertFileDB certificate existance cache
         """
-        CertFileDB.setup(self.TEST_STORAGE, maintain_info=False)
+        CertFileDB.setup(self.TEST_STORAGE, structure_level=1, maintain_info=False)
         db = CertFileDB(self.TEST_STORAGE)
         db_ronly = CertFileDBReadOnly(self.TEST_STORAGE)
         # Insert and commit some certificates and check cache
@@ -260,28 +304,34 @@ class TestCertFileDBReadOnly(unittest.TestCase):
         db.rollback()
 
         # Check speed improvement using cache - on large number of certs
-        inserted = insert_random_certs(db, 1000)
+        inserted = insert_random_certs(db, 200)
         db.commit()
-        t0 = time.clock()
-        for cert in inserted:
-            db_ronly.exists(cert)
-        t1 = time.clock()
-        for cert in inserted:
-            db_ronly.exists(cert)
-        t2 = time.clock()
+        # Start with empty cache and keep garbage collection out of the timing
+        db_ronly._cache.clear()
+        gc.disable()
+        try:
+            t0 = time.perf_counter()
+            for cert in inserted:
+                db_ronly.exists(cert)
+            t1 = time.perf_counter()
+            for cert in inserted:
+                db_ronly.exists(cert)
+            t2 = time.perf_counter()
+        finally:
+            gc.enable()
         self.assertGreater(t1 - t0, t2 - t1)
 
 
 class TestCertFileDB(unittest.TestCase):
     """Unit test class of CertFileDB class"""
 
-    TEST_STORAGE = 'tests/test_storage'
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp(dir=TEST_TMP_DIR)
+        self.TEST_STORAGE = os.path.join(self._tmp_dir, 'test_storage')
 
     def tearDown(self):
-        # Clear test storage
-        shutil.rmtree(self.TEST_STORAGE, ignore_errors=True)
-        if os.path.exists(self.TEST_STORAGE + '.zip'):
-            os.remove(self.TEST_STORAGE + '.zip')
+        # Clear test storage, zip of the storage with 0 structure_level is also there
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
 
     def test_init(self):
         """
@@ -298,26 +348,22 @@ class TestCertFileDB(unittest.TestCase):
         """
         Test implementation of CertDB method GET
         """
-        CertFileDB.setup(self.TEST_STORAGE, maintain_info=False)
+        CertFileDB.setup(self.TEST_STORAGE, structure_level=1, maintain_info=False)
         db = CertFileDB(self.TEST_STORAGE)
         fake_cert_id = 'fakecertid'
         # Insert and commit some certificates and retrieve them back
         committed = commit_test_certs(db, TEST_CERTS_1)
-        with open(TEST_CERTS_1) as r_file:
-            for line in r_file:
-                cert_id, cert = line.split(',')
-                self.assertEqual(db.get(cert_id), cert.strip())
+        certs = load_test_certs(TEST_CERTS_1)
+        self.assertEqual([db.get(cert_id) for cert_id, _ in certs], [cert for _, cert in certs])
 
         # Only insert other certificates and retrieve them back
         inserted = insert_test_certs(db, TEST_CERTS_2)
-        with open(TEST_CERTS_2) as r_file:
-            for line in r_file:
-                cert_id, cert = line.split(',')
-                self.assertEqual(db.get(cert_id), cert.strip())
-            # Rollback and try to retrieve them again
-            db.rollback()
-            for cert_id in inserted:
-                self.assertRaises(CertNotAvailableError, db.get, cert_id)
+        certs = load_test_certs(TEST_CERTS_2)
+        self.assertEqual([db.get(cert_id) for cert_id, _ in certs], [cert for _, cert in certs])
+        # Rollback and try to retrieve them again
+        db.rollback()
+        for cert_id in inserted:
+            self.assertRaises(CertNotAvailableError, db.get, cert_id)
 
         # Test DELETE method effect
         db.delete(committed[0])
@@ -334,14 +380,16 @@ class TestCertFileDB(unittest.TestCase):
         def test_permission(db, valid_cert_id):
             if not sys.platform.startswith('linux'):
                 return  # works only on Linux like systems
-            fake_target_dir = 'tests/fake_export'
+            if os.geteuid() == 0:
+                return  # root can write regardless of permissions
+            fake_target_dir = os.path.join(self._tmp_dir, 'fake_export')
             os.mkdir(fake_target_dir)
-            subprocess.call(['chmod', '-w', fake_target_dir])
+            os.chmod(fake_target_dir, 0o555)
             self.assertRaises(PermissionError, db.export, valid_cert_id, fake_target_dir)
-            subprocess.call(['chmod', '+w', fake_target_dir])
+            os.chmod(fake_target_dir, 0o755)
             os.rmdir(fake_target_dir)
 
-        CertFileDB.setup(self.TEST_STORAGE, maintain_info=False)
+        CertFileDB.setup(self.TEST_STORAGE, structure_level=1, maintain_info=False)
         db = CertFileDB(self.TEST_STORAGE)
         target_dir = self.TEST_STORAGE + '/export'
         os.mkdir(target_dir)
@@ -349,40 +397,37 @@ class TestCertFileDB(unittest.TestCase):
 
         # Insert and commit some certificates and export them
         committed = commit_test_certs(db, TEST_CERTS_1)
-        with open(TEST_CERTS_1) as r_file:
-            for line in r_file:
-                cert_id, cert = line.split(',')
-                expected = os.path.join(target_dir, make_PEM_filename(cert_id))
-                self.assertEqual(db.export(cert_id, target_dir), expected)
-                with open(expected) as target:
-                    self.assertEqual(target.read(), cert.strip())
-                # Check export without unnecessary copying - should copy anyway because persisted
-                self.assertEqual(db.export(cert_id, target_dir, copy_if_exists=False), expected)
+        for cert_id, cert in load_test_certs(TEST_CERTS_1):
+            expected = os.path.join(target_dir, make_PEM_filename(cert_id))
+            self.assertEqual(db.export(cert_id, target_dir), expected)
+            with open(expected) as target:
+                self.assertEqual(target.read(), cert)
+        # Check export without unnecessary copying - should copy anyway because persisted
+        persisted_id = load_test_certs(TEST_CERTS_1)[-1][0]
+        expected = os.path.join(target_dir, make_PEM_filename(persisted_id))
+        self.assertEqual(db.export(persisted_id, target_dir, copy_if_exists=False), expected)
         # Tests writing permissions for exporting from zipfile
-        test_permission(db, cert_id)
+        test_permission(db, persisted_id)
 
         # Only insert other certificates and retrieve them back
         insert_test_certs(db, TEST_CERTS_2)
-        with open(TEST_CERTS_2) as r_file:
-            for line in r_file:
-                cert_id, cert = line.split(',')
-                expected = os.path.join(target_dir, make_PEM_filename(cert_id))
-                self.assertEqual(db.export(cert_id, target_dir), expected)
-                with open(expected) as target:
-                    self.assertEqual(target.read(), cert.strip())
-                # Check export without unnecessary copying
-                file = db.export(cert_id, target_dir, copy_if_exists=False)
-                self.assertNotEqual(file, expected)
-                with open(file) as target:
-                    self.assertEqual(target.read(), cert.strip())
-            # Tests writing permissions for exporting from transaction
-            test_permission(db, cert_id)
-            # Rollback and try to retrieve them again
-            db.rollback()
-            r_file.seek(0)
-            for line in r_file:
-                cert_id = line.split(',')[0]
-                self.assertRaises(CertNotAvailableError, db.export, cert_id, target_dir)
+        for cert_id, cert in load_test_certs(TEST_CERTS_2):
+            expected = os.path.join(target_dir, make_PEM_filename(cert_id))
+            self.assertEqual(db.export(cert_id, target_dir), expected)
+            with open(expected) as target:
+                self.assertEqual(target.read(), cert)
+            # Check export without unnecessary copying
+            file = db.export(cert_id, target_dir, copy_if_exists=False)
+            self.assertNotEqual(file, expected)
+            with open(file) as target:
+                self.assertEqual(target.read(), cert)
+        # Tests writing permissions for exporting from transaction
+        inserted_id = load_test_certs(TEST_CERTS_2)[-1][0]
+        test_permission(db, inserted_id)
+        # Rollback and try to retrieve them again
+        db.rollback()
+        for cert_id, _ in load_test_certs(TEST_CERTS_2):
+            self.assertRaises(CertNotAvailableError, db.export, cert_id, target_dir)
 
         # Test DELETE method effect
         db.delete(committed[0])
@@ -395,7 +440,7 @@ class TestCertFileDB(unittest.TestCase):
         """
         Test implementation of CertDB method EXISTS
         """
-        CertFileDB.setup(self.TEST_STORAGE, maintain_info=False)
+        CertFileDB.setup(self.TEST_STORAGE, structure_level=1, maintain_info=False)
         db = CertFileDB(self.TEST_STORAGE)
         fake_cert = 'fakecertid'
         # Insert and commit some certificates and check if exists
@@ -413,6 +458,8 @@ class TestCertFileDB(unittest.TestCase):
         # Test DELETE method effect
         db.delete(committed[0])
         assert not db.exists(committed[0])
+        assert not db.exists_all(committed)
+        assert db.exists_all(committed[1:] + inserted)
 
         # Test fake certificate that doesn't exist
         committed.append(fake_cert)
@@ -423,7 +470,7 @@ class TestCertFileDB(unittest.TestCase):
         """
         Test implementation of CertDB method INSERT
         """
-        CertFileDB.setup(self.TEST_STORAGE, maintain_info=False)
+        CertFileDB.setup(self.TEST_STORAGE, structure_level=1, maintain_info=False)
         db = CertFileDB(self.TEST_STORAGE)
         # Insert some invalid certificates
         self.assertRaises(CertInvalidError, db.insert, None, None)
@@ -436,17 +483,13 @@ class TestCertFileDB(unittest.TestCase):
         blocks = {**db._to_insert}
         # transaction should contain certificates from open transcation and certs should exist
         self.assertTrue(db._to_insert)
-        for cert in inserted:
-            block_path = db._get_block_path(cert)
-            assert os.path.exists(os.path.join(block_path, cert))
+        assert not missing_cert_files(db, inserted)
 
         # Insert different certificates under the same IDs
         certs = {}
-        with open(TEST_CERTS_1) as r_file:
-            for line in r_file:
-                els = [e.strip() for e in line.split(',')]
-                db.insert(els[0], els[1] + '_open')
-                certs[els[0]] = els[1]
+        for cert_id, cert in load_test_certs(TEST_CERTS_1):
+            db.insert(cert_id, cert + '_open')
+            certs[cert_id] = cert
         # IDs should be same and certificates should not be changed
         self.assertTrue(blocks == db._to_insert)
         for k, v in certs.items():
@@ -456,11 +499,9 @@ class TestCertFileDB(unittest.TestCase):
         db.commit()
         self.assertFalse(db._to_insert)
         certs = {}
-        with open(TEST_CERTS_1) as r_file:
-            for line in r_file:
-                els = [el.strip() for el in line.split(',')]
-                db.insert(els[0], els[1] + '_commit')
-                certs[els[0]] = els[1]
+        for cert_id, cert in load_test_certs(TEST_CERTS_1):
+            db.insert(cert_id, cert + '_commit')
+            certs[cert_id] = cert
         # IDs should be same and persisted certificates should not be changed
         self.assertTrue(blocks == db._to_insert)
         db.commit()
@@ -468,11 +509,35 @@ class TestCertFileDB(unittest.TestCase):
         for k, v in certs.items():
             self.assertTrue(db.get(k) == v)
 
+    def test_insert_many(self):
+        """
+        Test implementation of CertDB method INSERT_MANY
+        """
+        CertFileDB.setup(self.TEST_STORAGE, structure_level=1, maintain_info=False)
+        db = CertFileDB(self.TEST_STORAGE)
+        # Insert some invalid certificates
+        self.assertRaises(CertInvalidError, db.insert_many, [('valid', 'valid'), ('', 'valid')])
+        db.rollback()
+        # Insert nothing
+        db.insert_many([])
+        self.assertFalse(db._to_insert)
+
+        # Insert some valid certificates, also as a generator
+        certs = list(load_test_certs(TEST_CERTS_1))
+        db.insert_many(certs[:2])
+        db.insert_many(cert for cert in certs[2:])
+        for cert_id, cert in certs:
+            assert os.path.exists(os.path.join(db._get_block_path(cert_id), cert_id))
+            self.assertEqual(db.get(cert_id), cert)
+        self.assertEqual(db.commit(), (len(certs), 0))
+        for cert_id, cert in certs:
+            self.assertEqual(db.get(cert_id), cert)
+
     def test_delete(self):
         """
         Test implementation of CertDB method DELETE
         """
-        CertFileDB.setup(self.TEST_STORAGE, maintain_info=False)
+        CertFileDB.setup(self.TEST_STORAGE, structure_level=1, maintain_info=False)
         db = CertFileDB(self.TEST_STORAGE)
         # Delete some invalid certificates
         self.assertRaises(CertInvalidError, db.delete, None)
@@ -484,9 +549,7 @@ class TestCertFileDB(unittest.TestCase):
         # transaction should be clear and files should not exist
         self.assertFalse(db._to_delete)
         self.assertFalse(db._to_insert)
-        for cert in inserted:
-            block_path = db._get_block_path(cert)
-            assert not os.path.exists(os.path.join(block_path, cert))
+        self.assertEqual(missing_cert_files(db, inserted), set(inserted))
 
         # Delete and insert the same certs before commit
         deleted = delete_test_certs(db, TEST_CERTS_1)
@@ -494,14 +557,14 @@ class TestCertFileDB(unittest.TestCase):
         # transaction should contain deleted and inserted certificates
         self.assertTrue(db._to_delete)
         self.assertTrue(db._to_insert)
+        deleted_set = set(deleted)
+        inserted_set = set(inserted)
         for certs in db._to_delete.values():
-            assert certs.issubset(set(deleted))
+            assert certs.issubset(deleted_set)
         for certs in db._to_insert.values():
-            assert certs.issubset(set(inserted))
+            assert certs.issubset(inserted_set)
         # and files should exist
-        for cert in inserted:
-            block_path = db._get_block_path(cert)
-            assert os.path.exists(os.path.join(block_path, cert))
+        assert not missing_cert_files(db, inserted)
         # now commit and check that files were persisted
         ins, dlt = db.commit()
         # the certs should be only inserted
@@ -534,11 +597,35 @@ class TestCertFileDB(unittest.TestCase):
         self.assertTrue(db._to_delete)
         self.assertEqual(blocks_to_delete, db._to_delete)
 
+    def test_delete_many(self):
+        """
+        Test implementation of CertDB method DELETE_MANY
+        """
+        CertFileDB.setup(self.TEST_STORAGE, structure_level=1, maintain_info=False)
+        db = CertFileDB(self.TEST_STORAGE)
+        # Delete some invalid certificates
+        self.assertRaises(CertInvalidError, db.delete_many, ['valid', ''])
+        db.rollback()
+        # Delete nothing
+        db.delete_many([])
+        self.assertFalse(db._to_delete)
+
+        # Delete persisted certificates, also as a generator
+        inserted = insert_test_certs(db, TEST_CERTS_1)
+        db.commit()
+        db.delete_many(inserted[:2])
+        db.delete_many(cert for cert in inserted[2:])
+        for cert in inserted:
+            assert not db.exists(cert)
+        self.assertEqual(db.commit(), (0, len(inserted)))
+        for cert in inserted:
+            assert not db.exists(cert)
+
     def test_rollback(self):
         """
         Test implementation of CertDB method ROLLBACK
         """
-        CertFileDB.setup(self.TEST_STORAGE, maintain_info=False)
+        CertFileDB.setup(self.TEST_STORAGE, structure_level=1, maintain_info=False)
         db = CertFileDB(self.TEST_STORAGE)
         # Test rollback without inserts
         db.rollback()
@@ -548,9 +635,7 @@ class TestCertFileDB(unittest.TestCase):
         # Insert some certificates, rollback and check that blocks are deleted
         inserted = insert_test_certs(db, TEST_CERTS_1)
         db.rollback()
-        for cert in inserted:
-            block_path = db._get_block_path(cert)
-            assert not os.path.exists(os.path.join(block_path, cert))
+        self.assertEqual(missing_cert_files(db, inserted), set(inserted))
         # Transaction should be empty
         self.assertFalse(db._to_insert)
 
@@ -565,9 +650,7 @@ class TestCertFileDB(unittest.TestCase):
             assert not os.path.exists(db._get_block_path(cert) + cert)
             assert os.path.exists(db._get_block_archive(cert))
         # Rollbacked certs files should not exists
-        for cert in inserted:
-            block_path = db._get_block_path(cert)
-            assert not os.path.exists(os.path.join(block_path, cert))
+        self.assertEqual(missing_cert_files(db, inserted), set(inserted))
 
         # Check rollback of delete method
         deleted = delete_test_certs(db, TEST_CERTS_1)
@@ -583,7 +666,7 @@ class TestCertFileDB(unittest.TestCase):
         """
         Test implementation of CertDB method COMMIT
         """
-        CertFileDB.setup(self.TEST_STORAGE, maintain_info=False)
+        CertFileDB.setup(self.TEST_STORAGE, structure_level=1, maintain_info=False)
         db = CertFileDB(self.TEST_STORAGE)
         # Test commit without inserts
         ins, dlt = db.commit()
@@ -595,11 +678,10 @@ class TestCertFileDB(unittest.TestCase):
         inserted = insert_test_certs(db, TEST_CERTS_1)
         # Certificates and blocks from open transaction should exist
         self.assertTrue(db._to_insert)
+        inserted_set = set(inserted)
         for certs in db._to_insert.values():
-            assert certs.issubset(set(inserted))
-        for cert in inserted:
-            block_path = db._get_block_path(cert)
-            assert os.path.exists(os.path.join(block_path, cert))
+            assert certs.issubset(inserted_set)
+        assert not missing_cert_files(db, inserted)
         # check correct number of committed certs
         ins, dlt = db.commit()
         self.assertEqual(ins, len(inserted))
@@ -618,9 +700,7 @@ class TestCertFileDB(unittest.TestCase):
         self.assertEqual(ins, len(inserted_new))
         self.assertEqual(dlt, 0)
         # and the same ones should be deleted from transaction
-        for cert in inserted_again:
-            block_path = db._get_block_path(cert)
-            assert not os.path.exists(os.path.join(block_path, cert))
+        self.assertEqual(missing_cert_files(db, inserted_again), set(inserted_again))
 
         # Delete and insert the same not yet persisted cert and commit
         valid_cert = ['valid_cert', 'validvalidvalidvalidvalid']
@@ -650,12 +730,12 @@ class TestCertFileDB(unittest.TestCase):
         """
         Test maintaining commit HISTORY and INFO upon commit
         """
-        CertFileDB.setup(self.TEST_STORAGE, maintain_info=True)
+        CertFileDB.setup(self.TEST_STORAGE, structure_level=1, maintain_info=True)
         db = CertFileDB(self.TEST_STORAGE)
         meta_path = os.path.join(db.storage, db.META_FILENAME)
         # Insert some certificates and check INFO after commit
         committed = commit_test_certs(db, TEST_CERTS_1)
-        meta = toml.load(meta_path, OrderedDict)
+        meta = load_toml(meta_path)
         last_commit_nr = str(len(meta['HISTORY']))
         self.assertEqual(last_commit_nr, '1')
         self.assertEqual(meta['INFO']['number_of_certificates'], len(committed))
@@ -666,7 +746,7 @@ class TestCertFileDB(unittest.TestCase):
         # Delete all the inserted certs and check INFO after commit
         deleted = delete_test_certs(db, TEST_CERTS_1)
         db.commit()
-        meta = toml.load(meta_path, OrderedDict)
+        meta = load_toml(meta_path)
         last_commit_nr = str(len(meta['HISTORY']))
         self.assertEqual(last_commit_nr, '2')
         self.assertEqual(meta['INFO']['number_of_certificates'], 0)
@@ -679,7 +759,7 @@ class TestCertFileDB(unittest.TestCase):
         inserted = insert_test_certs(db, TEST_CERTS_2)
         deleted = delete_test_certs(db, TEST_CERTS_1)
         db.commit()
-        meta = toml.load(meta_path, OrderedDict)
+        meta = load_toml(meta_path)
         last_commit_nr = str(len(meta['HISTORY']))
         self.assertEqual(last_commit_nr, '4')
         self.assertEqual(meta['INFO']['number_of_certificates'], len(inserted))
@@ -718,10 +798,8 @@ class TestCertFileDB(unittest.TestCase):
         self.assertFalse(db._to_insert)
         self.assertFalse(db._to_delete)
         # Retrieve and check persisted certs
-        with open(TEST_CERTS_1) as r_file:
-            for line in r_file:
-                cert_id, cert = line.split(',')
-                self.assertEqual(db.get(cert_id), cert.strip())
+        certs = load_test_certs(TEST_CERTS_1)
+        self.assertEqual([db.get(cert_id) for cert_id, _ in certs], [cert for _, cert in certs])
         # Delete all remaining certificates and check zip cleanup
         deleted = delete_test_certs(db, TEST_CERTS_1)
         db.commit()
@@ -745,9 +823,7 @@ class TestCertFileDB(unittest.TestCase):
         # Insert some certificates and check commit
         inserted = insert_test_certs(db, TEST_CERTS_1)
         # Certificates and blocks from open transaction should exist
-        for cert in inserted:
-            block_path = db._get_block_path(cert)
-            assert os.path.exists(os.path.join(block_path, cert))
+        assert not missing_cert_files(db, inserted)
         # check correct number of committed certs
         ins, dlt = db.commit()
         self.assertEqual(ins, len(inserted))
@@ -766,9 +842,7 @@ class TestCertFileDB(unittest.TestCase):
         self.assertEqual(ins, len(inserted_new))
         self.assertEqual(dlt, 0)
         # and the same ones should be deleted from transaction
-        for cert in inserted_again:
-            block_path = db._get_block_path(cert)
-            assert not os.path.exists(os.path.join(block_path, cert))
+        self.assertEqual(missing_cert_files(db, inserted_again), set(inserted_again))
 
         # Delete and insert the same not yet persisted cert and commit
         valid_cert = ['valid_cert', 'validvalidvalidvalidvalid']
@@ -793,17 +867,15 @@ class TestCertFileDB(unittest.TestCase):
 class TestCompositeCertDB(unittest.TestCase):
     """Unit test class of CompositeCertDB class"""
 
-    TEST_STORAGE_1 = 'tests/test_storage1'
-    TEST_STORAGE_2 = 'tests/test_storage2'
-    TEST_STORAGE_3 = 'tests/test_storage3'
-
     def tearDown(self):
         # Clear test storage
-        shutil.rmtree(self.TEST_STORAGE_1, ignore_errors=True)
-        shutil.rmtree(self.TEST_STORAGE_2, ignore_errors=True)
-        shutil.rmtree(self.TEST_STORAGE_3, ignore_errors=True)
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
 
     def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp(dir=TEST_TMP_DIR)
+        self.TEST_STORAGE_1 = os.path.join(self._tmp_dir, 'test_storage1')
+        self.TEST_STORAGE_2 = os.path.join(self._tmp_dir, 'test_storage2')
+        self.TEST_STORAGE_3 = os.path.join(self._tmp_dir, 'test_storage3')
         CertFileDB.setup(self.TEST_STORAGE_1)
         CertFileDB.setup(self.TEST_STORAGE_2)
         CertFileDB.setup(self.TEST_STORAGE_3)
@@ -896,25 +968,21 @@ class TestCompositeCertDB(unittest.TestCase):
         fake_cert_id = 'fakecertid'
         # Insert and commit some certificates and retrieve them back
         committed = commit_test_certs(composite_db, TEST_CERTS_1)
-        with open(TEST_CERTS_1) as r_file:
-            for line in r_file:
-                cert_id, cert = line.split(',')
-                self.assertEqual(composite_db.get(cert_id), cert.strip())
-                # ReadOnly DB should also have it
-                self.assertEqual(real_db_read_only.get(cert_id), cert.strip())
+        for cert_id, cert in load_test_certs(TEST_CERTS_1):
+            self.assertEqual(composite_db.get(cert_id), cert)
+            # ReadOnly DB should also have it
+            self.assertEqual(real_db_read_only.get(cert_id), cert)
 
         # Only insert other certificates and retrieve them back
         inserted = insert_test_certs(composite_db, TEST_CERTS_2)
-        with open(TEST_CERTS_2) as r_file:
-            for line in r_file:
-                cert_id, cert = line.split(',')
-                self.assertEqual(composite_db.get(cert_id), cert.strip())
-                # ReadOnly DB should not have it
-                self.assertRaises(CertNotAvailableError, real_db_read_only.get, cert_id)
-            # Rollback and try to retrieve them again
-            composite_db.rollback()
-            for cert_id in inserted:
-                self.assertRaises(CertNotAvailableError, composite_db.get, cert_id)
+        for cert_id, cert in load_test_certs(TEST_CERTS_2):
+            self.assertEqual(composite_db.get(cert_id), cert)
+            # ReadOnly DB should not have it
+            self.assertRaises(CertNotAvailableError, real_db_read_only.get, cert_id)
+        # Rollback and try to retrieve them again
+        composite_db.rollback()
+        for cert_id in inserted:
+            self.assertRaises(CertNotAvailableError, composite_db.get, cert_id)
 
         # Test DELETE method effect
         real_db.delete(committed[0])
@@ -946,40 +1014,36 @@ class TestCompositeCertDB(unittest.TestCase):
         os.mkdir(target_dir)
         # Insert and commit some certificates and export them
         committed = commit_test_certs(composite_db, TEST_CERTS_1)
-        with open(TEST_CERTS_1) as r_file:
-            for line in r_file:
-                cert_id, cert = line.split(',')
-                expected = os.path.join(target_dir, make_PEM_filename(cert_id))
-                self.assertEqual(composite_db.export(cert_id, target_dir), expected)
-                with open(expected) as target:
-                    self.assertEqual(target.read(), cert.strip())
-                # Check export without unnecessary copying - should copy anyway because persisted
-                self.assertEqual(composite_db.export(cert_id, target_dir, copy_if_exists=False), expected)
-                # ReadOnly DB should also have it
-                self.assertEqual(real_db_read_only.export(cert_id, target_dir), expected)
+        for cert_id, cert in load_test_certs(TEST_CERTS_1):
+            expected = os.path.join(target_dir, make_PEM_filename(cert_id))
+            self.assertEqual(composite_db.export(cert_id, target_dir), expected)
+            with open(expected) as target:
+                self.assertEqual(target.read(), cert)
+            # ReadOnly DB should also have it
+            self.assertEqual(real_db_read_only.export(cert_id, target_dir), expected)
+        # Check export without unnecessary copying - should copy anyway because persisted
+        persisted_id = load_test_certs(TEST_CERTS_1)[-1][0]
+        expected = os.path.join(target_dir, make_PEM_filename(persisted_id))
+        self.assertEqual(composite_db.export(persisted_id, target_dir, copy_if_exists=False), expected)
 
         # Only insert other certificates and retrieve them back
         insert_test_certs(composite_db, TEST_CERTS_2)
-        with open(TEST_CERTS_2) as r_file:
-            for line in r_file:
-                cert_id, cert = line.split(',')
-                expected = os.path.join(target_dir, make_PEM_filename(cert_id))
-                self.assertEqual(composite_db.export(cert_id, target_dir), expected)
-                with open(expected) as target:
-                    self.assertEqual(target.read(), cert.strip())
-                # Check export without unnecessary copying
-                file = composite_db.export(cert_id, target_dir, copy_if_exists=False)
-                self.assertNotEqual(file, expected)
-                with open(file) as target:
-                    self.assertEqual(target.read(), cert.strip())
-                # ReadOnly DB should not have it
-                self.assertRaises(CertNotAvailableError, real_db_read_only.export, cert_id, target_dir)
-            # Rollback and try to retrieve them again
-            composite_db.rollback()
-            r_file.seek(0)
-            for line in r_file:
-                cert_id = line.split(',')[0]
-                self.assertRaises(CertNotAvailableError, composite_db.export, cert_id, target_dir)
+        for cert_id, cert in load_test_certs(TEST_CERTS_2):
+            expected = os.path.join(target_dir, make_PEM_filename(cert_id))
+            self.assertEqual(composite_db.export(cert_id, target_dir), expected)
+            with open(expected) as target:
+                self.assertEqual(target.read(), cert)
+            # Check export without unnecessary copying
+            file = composite_db.export(cert_id, target_dir, copy_if_exists=False)
+            self.assertNotEqual(file, expected)
+            with open(file) as target:
+                self.assertEqual(target.read(), cert)
+            # ReadOnly DB should not have it
+            self.assertRaises(CertNotAvailableError, real_db_read_only.export, cert_id, target_dir)
+        # Rollback and try to retrieve them again
+        composite_db.rollback()
+        for cert_id, _ in load_test_certs(TEST_CERTS_2):
+            self.assertRaises(CertNotAvailableError, composite_db.export, cert_id, target_dir)
 
         # Test DELETE method effect
         real_db.delete(committed[0])
@@ -1075,19 +1139,14 @@ class TestCompositeCertDB(unittest.TestCase):
         # transaction should contain certificates from open transcation and certs should exist
         self.assertTrue(real_db._to_insert)
         self.assertTrue(real_db2._to_insert)
-        for cert in inserted:
-            block_path = real_db._get_block_path(cert)
-            block_path2 = real_db2._get_block_path(cert)
-            assert os.path.exists(os.path.join(block_path, cert))
-            assert os.path.exists(os.path.join(block_path2, cert))
+        assert not missing_cert_files(real_db, inserted)
+        assert not missing_cert_files(real_db2, inserted)
 
         # Insert different certificates under the same IDs
         certs = {}
-        with open(TEST_CERTS_1) as r_file:
-            for line in r_file:
-                els = [e.strip() for e in line.split(',')]
-                composite_db.insert(els[0], els[1] + '_open')
-                certs[els[0]] = els[1]
+        for cert_id, cert in load_test_certs(TEST_CERTS_1):
+            composite_db.insert(cert_id, cert + '_open')
+            certs[cert_id] = cert
         # IDs should be same and certificates should not be changed
         self.assertTrue(blocks == real_db._to_insert)
         self.assertTrue(blocks2 == real_db2._to_insert)
@@ -1100,11 +1159,9 @@ class TestCompositeCertDB(unittest.TestCase):
         self.assertFalse(real_db._to_insert)
         self.assertFalse(real_db2._to_insert)
         certs = {}
-        with open(TEST_CERTS_1) as r_file:
-            for line in r_file:
-                els = [el.strip() for el in line.split(',')]
-                composite_db.insert(els[0], els[1] + '_commit')
-                certs[els[0]] = els[1]
+        for cert_id, cert in load_test_certs(TEST_CERTS_1):
+            composite_db.insert(cert_id, cert + '_commit')
+            certs[cert_id] = cert
         # IDs should be same and persisted certificates should not be changed
         self.assertTrue(blocks == real_db._to_insert)
         self.assertTrue(blocks2 == real_db2._to_insert)
@@ -1115,6 +1172,30 @@ class TestCompositeCertDB(unittest.TestCase):
             self.assertTrue(real_db.get(k) == v)
             self.assertTrue(real_db2.get(k) == v)
 
+    def test_insert_many(self):
+        """
+        Test implementation of CompositeCertDB method INSERT_MANY
+        """
+        real_db = CertFileDB(self.TEST_STORAGE_1)
+        real_db2 = CertFileDB(self.TEST_STORAGE_2)
+        real_db_read_only = CertFileDBReadOnly(self.TEST_STORAGE_3)
+        composite_db = CompositeCertDB()
+        composite_db.register(real_db)
+        composite_db.register(real_db2)
+        composite_db.register(real_db_read_only)
+
+        # Insert generator of certificates, all IO allowed components should get all of them
+        certs = list(load_test_certs(TEST_CERTS_1))
+        composite_db.insert_many(cert for cert in certs)
+        for cert_id, cert in certs:
+            self.assertEqual(real_db.get(cert_id), cert)
+            self.assertEqual(real_db2.get(cert_id), cert)
+            assert not real_db_read_only.exists(cert_id)
+        composite_db.commit()
+        for cert_id, _ in certs:
+            assert real_db.exists(cert_id)
+            assert real_db2.exists(cert_id)
+
     def test_delete(self):
         """
         Test implementation of CompositeCertDB method DELETE
@@ -1136,11 +1217,8 @@ class TestCompositeCertDB(unittest.TestCase):
         self.assertFalse(real_db2._to_delete)
         self.assertFalse(real_db._to_insert)
         self.assertFalse(real_db2._to_insert)
-        for cert in inserted:
-            block_path = real_db._get_block_path(cert)
-            block_path2 = real_db2._get_block_path(cert)
-            assert not os.path.exists(os.path.join(block_path, cert))
-            assert not os.path.exists(os.path.join(block_path2, cert))
+        self.assertEqual(missing_cert_files(real_db, inserted), set(inserted))
+        self.assertEqual(missing_cert_files(real_db2, inserted), set(inserted))
 
         # Delete and insert the same certs before commit
         deleted = delete_test_certs(composite_db, TEST_CERTS_1)
@@ -1150,20 +1228,19 @@ class TestCompositeCertDB(unittest.TestCase):
         self.assertTrue(real_db2._to_delete)
         self.assertTrue(real_db._to_insert)
         self.assertTrue(real_db2._to_insert)
+        deleted_set = set(deleted)
+        inserted_set = set(inserted)
         for certs in real_db._to_delete.values():
-            assert certs.issubset(set(deleted))
+            assert certs.issubset(deleted_set)
         for certs in real_db2._to_delete.values():
-            assert certs.issubset(set(deleted))
+            assert certs.issubset(deleted_set)
         for certs in real_db._to_insert.values():
-            assert certs.issubset(set(inserted))
+            assert certs.issubset(inserted_set)
         for certs in real_db2._to_insert.values():
-            assert certs.issubset(set(inserted))
+            assert certs.issubset(inserted_set)
         # and files should exist
-        for cert in inserted:
-            block_path = real_db._get_block_path(cert)
-            block_path2 = real_db2._get_block_path(cert)
-            assert os.path.exists(os.path.join(block_path, cert))
-            assert os.path.exists(os.path.join(block_path2, cert))
+        assert not missing_cert_files(real_db, inserted)
+        assert not missing_cert_files(real_db2, inserted)
         # now commit and check that files were persisted
         ins, dlt = composite_db.commit()
         # the certs should be only inserted
@@ -1206,6 +1283,28 @@ class TestCompositeCertDB(unittest.TestCase):
         self.assertEqual(blocks_to_delete, real_db._to_delete)
         self.assertEqual(blocks_to_delete2, real_db2._to_delete)
 
+    def test_delete_many(self):
+        """
+        Test implementation of CompositeCertDB method DELETE_MANY
+        """
+        real_db = CertFileDB(self.TEST_STORAGE_1)
+        real_db2 = CertFileDB(self.TEST_STORAGE_2)
+        composite_db = CompositeCertDB()
+        composite_db.register(real_db)
+        composite_db.register(real_db2)
+
+        # Delete generator of certificates, all IO allowed components should delete all of them
+        inserted = insert_test_certs(composite_db, TEST_CERTS_1)
+        composite_db.commit()
+        composite_db.delete_many(cert for cert in inserted)
+        for cert in inserted:
+            assert not real_db.exists(cert)
+            assert not real_db2.exists(cert)
+        composite_db.commit()
+        for cert in inserted:
+            assert not real_db.exists(cert)
+            assert not real_db2.exists(cert)
+
     def test_commit(self):
         """
         Test implementation of CompositeCertDB method COMMIT
@@ -1246,11 +1345,8 @@ class TestCompositeCertDB(unittest.TestCase):
         self.assertEqual(ins, len(inserted_new))
         self.assertEqual(dlt, 0)
         # and the same ones should NOT
-        for cert in inserted_again:
-            block_path = real_db._get_block_path(cert)
-            block_path2 = real_db2._get_block_path(cert)
-            assert not os.path.exists(os.path.join(block_path, cert))
-            assert not os.path.exists(os.path.join(block_path2, cert))
+        self.assertEqual(missing_cert_files(real_db, inserted_again), set(inserted_again))
+        self.assertEqual(missing_cert_files(real_db2, inserted_again), set(inserted_again))
 
         # Delete and insert the same not yet persisted cert and commit
         valid_cert = ['valid_cert', 'validvalidvalidvalidvalid']
@@ -1293,11 +1389,8 @@ class TestCompositeCertDB(unittest.TestCase):
         composite_db.rollback()
         self.assertFalse(real_db._to_insert)
         self.assertFalse(real_db2._to_insert)
-        for cert in inserted:
-            block_path = real_db._get_block_path(cert)
-            block_path2 = real_db2._get_block_path(cert)
-            assert not os.path.exists(os.path.join(block_path, cert))
-            assert not os.path.exists(os.path.join(block_path2, cert))
+        self.assertEqual(missing_cert_files(real_db, inserted), set(inserted))
+        self.assertEqual(missing_cert_files(real_db2, inserted), set(inserted))
 
         # Commit some certs, insert other certs and rollback
         committed = commit_test_certs(composite_db, TEST_CERTS_1)
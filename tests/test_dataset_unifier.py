@@ -0,0 +1,129 @@
+"""
+This module contains unit tests of cevast.dataset.unifiers package.
+"""
+
+import os
+import gzip
+import json
+import shutil
+import tempfile
+import unittest
+from cevast.certdb import CertFileDB
+from cevast.dataset.unifiers import RapidUnifier
+
+TEST_DATA_PATH = 'tests/data/'
+TEST_CERTS = TEST_DATA_PATH + '3-certs.gz'
+TEST_HOSTS = TEST_DATA_PATH + '3-hosts.gz'
+
+
+def read_gzip(filename: str) -> list:
+    """Return list of lines read from gzipped file."""
+    with gzip.open(filename, 'rt') as r_file:
+        return r_file.read().splitlines()
+
+
+class TestRapidUnifier(unittest.TestCase):
+    """Unit test class of RapidUnifier class"""
+
+    def setUp(self):
+        self.TEST_DIR = tempfile.mkdtemp()
+        self.TEST_STORAGE = os.path.join(self.TEST_DIR, 'storage')
+        CertFileDB.setup(self.TEST_STORAGE, structure_level=1, maintain_info=False)
+        self.certdb = CertFileDB(self.TEST_STORAGE)
+        self.chain_file = os.path.join(self.TEST_DIR, 'chains.gz')
+        self.broken_file = os.path.join(self.TEST_DIR, 'broken_chains.gz')
+        # Hosts dataset with multiple certificates per host
+        self.hosts_file = os.path.join(self.TEST_DIR, 'hosts.gz')
+        with gzip.open(self.hosts_file, 'wt') as w_file:
+            w_file.write('1.1.1.1,1f843dcbdc9961b7a26cee59df251c8ad59e77e8\n')
+            w_file.write('1.1.1.1,89e7a432a257d79b58b5909d1912124af99f9b35\n')
+            w_file.write('2.2.2.2,1f843dcbdc9961b7a26cee59df251c8ad59e77e8\n')
+            w_file.write('2.2.2.2,40cef3046c916ed7ae557f60e76842828b51de53\n')
+            w_file.write('3.3.3.3,89a7a432a257d79b58b5909d1912124af99f9b35\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.TEST_DIR, ignore_errors=True)
+
+    def test_init(self):
+        """Test of RapidUnifier class instantiation."""
+        self.assertRaises(FileNotFoundError, RapidUnifier, TEST_CERTS + 'x', TEST_HOSTS, self.chain_file)
+        self.assertRaises(FileNotFoundError, RapidUnifier, TEST_CERTS, TEST_HOSTS + 'x', self.chain_file)
+        unifier = RapidUnifier(TEST_CERTS, TEST_HOSTS, self.chain_file)
+        self.assertEqual(unifier.certs_dataset, TEST_CERTS)
+        self.assertEqual(unifier.hosts_dataset, TEST_HOSTS)
+        self.assertEqual(unifier.chain_file, self.chain_file)
+
+    def test_parse(self):
+        """Test of RapidUnifier parsing generators."""
+        certs = list(RapidUnifier.parse_certs(TEST_CERTS))
+        self.assertEqual(len(certs), 3)
+        self.assertEqual(certs[0][0], '1f843dcbdc9961b7a26cee59df251c8ad59e77e8')
+        assert certs[0][1].startswith('MIICxDCCAawCCQDX1VjYhulwwzANBgkqhkiG9w0')
+
+        chains = [(host, list(chain)) for host, chain in RapidUnifier.parse_chains(self.hosts_file)]
+        self.assertEqual(chains, [
+            ('1.1.1.1', ['1f843dcbdc9961b7a26cee59df251c8ad59e77e8', '89e7a432a257d79b58b5909d1912124af99f9b35']),
+            ('2.2.2.2', ['1f843dcbdc9961b7a26cee59df251c8ad59e77e8', '40cef3046c916ed7ae557f60e76842828b51de53']),
+            ('3.3.3.3', ['89a7a432a257d79b58b5909d1912124af99f9b35']),
+        ])
+
+    def test_parse_malformed(self):
+        """Test of RapidUnifier parsing generators with whitespace around fields and malformed records."""
+        records_file = os.path.join(self.TEST_DIR, 'records.gz')
+        with gzip.open(records_file, 'wt') as w_file:
+            w_file.write(' 1.1.1.1 , abc \r\n')
+        self.assertEqual(list(RapidUnifier.parse_certs(records_file)), [('1.1.1.1', 'abc')])
+        self.assertEqual([(host, list(chain)) for host, chain in RapidUnifier.parse_chains(records_file)],
+                         [('1.1.1.1', ['abc'])])
+
+        with gzip.open(records_file, 'wt') as w_file:
+            w_file.write('1.1.1.1,abc,junk\n')
+        self.assertRaises(ValueError, list, RapidUnifier.parse_certs(records_file))
+        self.assertRaises(ValueError, list, RapidUnifier.parse_chains(records_file))
+        unifier = RapidUnifier(TEST_CERTS, records_file, self.chain_file)
+        self.assertRaises(ValueError, unifier.store_chains, self.certdb)
+
+    def test_store(self):
+        """Test of RapidUnifier methods STORE_CERTS and STORE_CHAINS."""
+        unifier = RapidUnifier(TEST_CERTS, self.hosts_file, self.chain_file, self.broken_file)
+        unifier.store_certs(self.certdb)
+        assert self.certdb.exists_all(['1f843dcbdc9961b7a26cee59df251c8ad59e77e8',
+                                       '89e7a432a257d79b58b5909d1912124af99f9b35',
+                                       '89a7a432a257d79b58b5909d1912124af99f9b35'])
+        assert self.certdb.get('1f843dcbdc9961b7a26cee59df251c8ad59e77e8').startswith('-----BEGIN CERTIFICATE-----\n')
+
+        unifier.store_chains(self.certdb)
+        self.assertEqual(read_gzip(self.chain_file), [
+            '1.1.1.1,1f843dcbdc9961b7a26cee59df251c8ad59e77e8,89e7a432a257d79b58b5909d1912124af99f9b35',
+            '3.3.3.3,89a7a432a257d79b58b5909d1912124af99f9b35',
+        ])
+        self.assertEqual(read_gzip(self.broken_file), [
+            '2.2.2.2,1f843dcbdc9961b7a26cee59df251c8ad59e77e8,40cef3046c916ed7ae557f60e76842828b51de53',
+        ])
+        self.assertEqual(unifier.unification_log, {
+            'total_certs': 3,
+            'total_hosts': 3,
+            'total_host_certs': 5,
+            'broken_chains': 1,
+        })
+        # Chains are readable back in the unified format
+        chains = [(host, list(chain)) for host, chain in RapidUnifier.read_chains(self.chain_file)]
+        self.assertEqual(chains[1], ('3.3.3.3', ['89a7a432a257d79b58b5909d1912124af99f9b35']))
+
+        # Unification log is saved as JSON
+        log_file = os.path.join(self.TEST_DIR, 'unification.log')
+        unifier.save_unification_log(log_file)
+        with open(log_file) as r_file:
+            self.assertEqual(json.load(r_file), unifier.unification_log)
+
+    def test_store_without_broken(self):
+        """Test of RapidUnifier method STORE_CHAINS without separate broken chain file."""
+        unifier = RapidUnifier(TEST_CERTS, self.hosts_file, self.chain_file)
+        unifier.store_chains(self.certdb)
+        self.assertEqual(len(read_gzip(self.chain_file)), 3)
+        self.assertEqual(unifier.unification_log['broken_chains'], -1)
+        self.assertEqual(unifier.unification_log['total_hosts'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
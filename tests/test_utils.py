@@ -0,0 +1,150 @@
+"""
+This module contains unit tests of cevast.utils package.
+"""
+
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+from cevast.utils import iter_gz_lines
+from cevast.utils.enrichment_analyzer import EnrichmentAnalyzer
+
+
+class TestIterGzLines(unittest.TestCase):
+    """Unit test class of iter_gz_lines function"""
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self._tmp_dir, 'test.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def write(self, data: bytes):
+        """Write raw data to the test file."""
+        with open(self.filename, 'wb') as w_file:
+            w_file.write(data)
+
+    def assertLinesEqual(self, expected: list, **kwargs):  # pylint: disable=invalid-name
+        """Assert that iter_gz_lines and gzip module read the expected lines from the test file."""
+        self.assertEqual(list(iter_gz_lines(self.filename, **kwargs)), expected)
+        with gzip.open(self.filename, 'rb') as r_file:
+            self.assertEqual(r_file.read().splitlines(), [line.encode() if isinstance(line, str) else line for line in expected])
+
+    def test_lines(self):
+        """Test of reading lines as bytes and decoded strings."""
+        self.write(gzip.compress(b'first\nsecond,line\n\nlast\n'))
+        self.assertLinesEqual([b'first', b'second,line', b'', b'last'])
+        self.assertLinesEqual(['first', 'second,line', '', 'last'], encoding='utf-8')
+
+    def test_missing_final_newline(self):
+        """Test that the last line without line end is returned."""
+        self.write(gzip.compress(b'first\nlast'))
+        self.assertLinesEqual([b'first', b'last'])
+        self.assertLinesEqual(['first', 'last'], encoding='utf-8')
+
+    def test_empty(self):
+        """Test of reading empty file and empty compressed data."""
+        self.write(b'')
+        self.assertLinesEqual([])
+        self.write(gzip.compress(b''))
+        self.assertLinesEqual([])
+
+    def test_chunk_boundary(self):
+        """Test of lines split across the chunk boundaries."""
+        lines = [('line%d' % i).encode() * (i % 7) for i in range(1000)]
+        self.write(gzip.compress(b'\n'.join(lines) + b'\n'))
+        for chunk_size in (1, 7, 64, 1000):
+            self.assertLinesEqual(lines, chunk_size=chunk_size)
+
+    def test_multi_member(self):
+        """Test of reading multi-member file, also with members ending on the chunk boundary."""
+        member_1, member_2 = gzip.compress(b'first\nsec'), gzip.compress(b'ond\nthird\n')
+        self.write(member_1 + member_2 + gzip.compress(b'') + gzip.compress(b'last'))
+        self.assertLinesEqual([b'first', b'second', b'third', b'last'])
+        self.assertLinesEqual([b'first', b'second', b'third', b'last'], chunk_size=len(member_1))
+        self.assertLinesEqual([b'first', b'second', b'third', b'last'], chunk_size=3)
+
+    def test_zero_padding(self):
+        """Test that zero padding after the members is skipped."""
+        member = gzip.compress(b'first\nlast\n')
+        self.write(member + b'\x00' * 100)
+        self.assertLinesEqual([b'first', b'last'])
+        self.assertLinesEqual([b'first', b'last'], chunk_size=len(member))
+        self.assertLinesEqual([b'first', b'last'], chunk_size=7)
+        # Next member after the padding
+        self.write(member + b'\x00' * 100 + member)
+        self.assertLinesEqual([b'first', b'last'] * 2)
+        self.assertLinesEqual([b'first', b'last'] * 2, chunk_size=7)
+
+    def test_corrupted(self):
+        """Test of reading truncated and corrupted file."""
+        data = gzip.compress(b'first\nlast\n')
+        # Truncated in the header, data and trailer
+        for end in (5, len(data) // 2, len(data) - 3):
+            self.write(data[:end])
+            self.assertRaises(EOFError, list, iter_gz_lines(self.filename))
+        # Not a gzipped file
+        self.write(b'first\nlast\n')
+        self.assertRaises(OSError, list, iter_gz_lines(self.filename))
+        # Nonzero data after the padding
+        self.write(data + b'\x00\x00garbage')
+        self.assertRaises(OSError, list, iter_gz_lines(self.filename))
+        # Checksum mismatch
+        self.write(data[:-8] + bytes(8))
+        self.assertRaises(OSError, list, iter_gz_lines(self.filename))
+
+
+class TestEnrichmentAnalyzer(unittest.TestCase):
+    """Unit test class of EnrichmentAnalyzer class"""
+
+    # Certificates 'a' and 'b' are in the dataset, 'x', 'y' and 'z' are missing 3, 2 and 1 times
+    HOSTS = [
+        ('1.1.1.1', ['a', 'b']),
+        ('2.2.2.2', ['a', 'x']),
+        ('3.3.3.3', ['b', 'x', 'y']),
+        ('4.4.4.4', ['x', 'y', 'z']),
+        ('5.5.5.5', ['a']),
+    ]
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        # Results are written to the working directory
+        self._cwd = os.getcwd()
+        os.chdir(self._tmp_dir)
+        self.certs_file = os.path.join(self._tmp_dir, '20200101_443_certs.gz')
+        self.hosts_file = os.path.join(self._tmp_dir, '20200101_443_hosts.gz')
+        with gzip.open(self.certs_file, 'wt') as w_file:
+            w_file.write('a,AAAA\nb,BBBB\n')
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def run_analyzer(self, hosts: list, enrichment_depth: int) -> str:
+        """Run the analyzer on hosts with given depth and return the content of results file."""
+        with gzip.open(self.hosts_file, 'wt') as w_file:
+            for host, chain in hosts:
+                for cert in chain:
+                    w_file.write('{},{}\n'.format(host, cert))
+        EnrichmentAnalyzer(self.certs_file, self.hosts_file, enrichment_depth).run()
+        with open('20200101_443_enrichment_stats') as r_file:
+            return r_file.read()
+
+    def test_enrichments(self):
+        """Test of complete chains counted for the enrichment levels."""
+        self.assertEqual(self.run_analyzer(self.HOSTS, 1), 'x\n\nTotal chains: 5\n\n0,2\n1,3\n')
+        self.assertEqual(self.run_analyzer(self.HOSTS, 2), 'x\ny\n\nTotal chains: 5\n\n0,2\n1,3\n2,4\n')
+        # Depth larger than the number of distinct missing certs
+        self.assertEqual(self.run_analyzer(self.HOSTS, 3), 'x\ny\nz\n\nTotal chains: 5\n\n0,2\n1,3\n2,4\n')
+        self.assertEqual(self.run_analyzer(self.HOSTS, 10), 'x\ny\nz\n\nTotal chains: 5\n\n0,2\n1,3\n2,4\n')
+
+    def test_no_broken_chains(self):
+        """Test of dataset without broken chains."""
+        hosts = [('1.1.1.1', ['a', 'b']), ('2.2.2.2', ['b'])]
+        self.assertEqual(self.run_analyzer(hosts, 3), '\nTotal chains: 2\n\n')
+
+
+if __name__ == '__main__':
+    unittest.main()